@@ -0,0 +1,79 @@
+#
+#   Benchmark for the L1Regressor backends in l1_regressor.py
+#   For each sample count, every backend is run in its own fresh process so that its peak memory
+#   (max RSS) can be reported alongside its solve time. The coefficients and the train/test errors
+#   of every backend are checked against the cvxpy LP that wine_quality.py originally solved.
+#
+#   NOTE: the L1 regression optimum on this data is very flat along the density/intercept direction,
+#   so different exact solvers can return a and b that differ in the first decimal place while
+#   giving the same mean absolute error. The check is therefore made on the predictions and errors.
+#
+#   Usage: python backend_benchmark.py [max_lp_samples]
+#
+
+import sys
+import resource
+import multiprocessing
+import numpy as np
+
+from wine_quality import load_data, format_data, num_train_samples, get_error
+from l1_regressor import L1Regressor
+from lp_benchmark import resample
+
+
+# Sample counts to benchmark (the LP backends are skipped past max_lp_samples)
+sample_sizes = [1500, 20000, 200000, 1000000]
+
+# Tolerances used when checking the backends against the reference cvxpy solution
+train_tol = 1e-5
+test_tol = 1e-3
+prediction_tol = 1e-2
+
+
+# Function run in a child process to fit one backend and report its results and peak memory
+def run_backend(backend, num_samples, queue):
+	data = load_data()
+	x, y = format_data(data, 0, num_train_samples)
+	x_test, y_test = format_data(data, num_train_samples, len(data))
+	if num_samples != num_train_samples:
+		x, y = resample(x, y, num_samples)
+
+	base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	model = L1Regressor(backend).fit(x, y)
+	peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+	train_err = get_error(model.a, model.b, x, y)[0]
+	test_err = get_error(model.a, model.b, x_test, y_test)[0]
+	queue.put((model.solve_time, (peak_rss - base_rss) / 1024.0, train_err, test_err, model.predict(x_test)))
+
+
+# Function to run one backend in a fresh process
+def benchmark(backend, num_samples):
+	ctx = multiprocessing.get_context('spawn')
+	queue = ctx.Queue()
+	proc = ctx.Process(target=run_backend, args=(backend, num_samples, queue))
+	proc.start()
+	result = queue.get()
+	proc.join()
+	return result
+
+
+if __name__ == '__main__':
+	max_lp = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+	print('{0:>8} {1:>7} {2:>10} {3:>14} {4:>12} {5:>12} {6:>8}'.format('N', 'Backend', 'Solve (s)', 'Extra RSS (MB)', 'Train MAE', 'Test MAE', 'Match'))
+	for n in sample_sizes:
+		reference = None
+		for backend in L1Regressor.backends:
+			if backend != 'irls' and n > max_lp:
+				continue
+			solve_time, rss, train_err, test_err, pred = benchmark(backend, n)
+
+			if reference is None:
+				reference = (train_err, test_err, pred)
+				match = '-'
+			else:
+				match = abs(train_err - reference[0]) < train_tol and abs(test_err - reference[1]) < test_tol and np.max(np.absolute(pred - reference[2])) < prediction_tol
+				match = 'yes' if match else 'NO'
+
+			print('{0:>8} {1:>7} {2:>10.3f} {3:>14.1f} {4:>12.8f} {5:>12.8f} {6:>8}'.format(n, backend, solve_time, rss, train_err, test_err, match))
@@ -0,0 +1,257 @@
+#
+#   Least-absolute-deviation (L1) regression engine used by wine_quality.py
+#   Fits the model  y ~ a x + b  by minimizing the mean absolute error (1/N) sum |y - a x - b|.
+#   As in wine_quality.py, x is stored as a (features x samples) matrix and y as a length N vector.
+#
+#   Three interchangeable backends are available...
+#       - 'cvxpy': the LP from wine_quality.py, written with one matrix constraint per direction
+#       - 'highs': the dual of the same LP handed straight to the HiGHS solver (through highspy when
+#                  installed, otherwise SciPy). It has only (features+1) equality constraints and
+#                  skips cvxpy's canonicalization entirely
+#       - 'irls':  iteratively reweighted least squares. Each iteration only needs the
+#                  (features+1) x (features+1) normal equations, so neither the slack vector z
+#                  nor any N x N / N x features copy of the data is ever built
+#   The default backend ('auto') picks the exact LP (HiGHS) for small datasets like the wine data, where
+#   it takes well under a second, and IRLS beyond auto_irls_samples, where IRLS is several times faster
+#   (measured with backend_benchmark.py: at 20000 samples HiGHS takes ~1-2 s and IRLS ~0.3-0.7 s, at
+#   200000 samples HiGHS takes ~78 s and IRLS ~2.6 s, with the same mean absolute error to 1e-7).
+#   After a fit, refit() re-optimizes when samples are appended or removed, warm started from the
+#   previous solution with HiGHS (through highspy) and from scratch with the other backends.
+#
+
+import time
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog
+
+
+# Number of samples past which the 'auto' backend switches from the exact LP (HiGHS) to IRLS
+auto_irls_samples = 5000
+
+# Number of samples handled at once when IRLS accumulates its normal equations
+irls_block_size = 65536
+
+
+# Function to build the L1 regression LP in cvxpy, using one matrix constraint per direction
+def build_problem(x, y):
+	import cvxpy as cvx
+
+	num_features, num_samples = x.shape
+
+	# Create three optimization variables
+	a = cvx.Variable(num_features)
+	b = cvx.Variable()
+	z = cvx.Variable(num_samples)
+
+	# The residual of every sample at once (x is stored features x N, so use its transpose)
+	residual = y - x.T @ a - b
+
+	# Create the LP constraints
+	constraints = [residual <= z, residual >= -z]
+
+	# Form the objective
+	obj = cvx.Minimize(cvx.sum(z) / num_samples)
+
+	return cvx.Problem(obj, constraints), a, b
+
+
+class L1Regressor (object):
+	backends = ['cvxpy', 'highs', 'irls']
+
+	def __init__ (self, backend='auto', tol=1e-10, max_iter=200):
+		if backend != 'auto' and backend not in self.backends:
+			raise ValueError("Unknown backend '%s', expected one of: auto, %s" % (backend, ', '.join(self.backends)))
+		self.backend = backend
+		self.tol = tol
+		self.max_iter = max_iter
+
+		self.a = None
+		self.b = None
+		self.value = None
+		self.status = None
+		self.solve_time = None
+		self.backend_used = None
+
+		# Training data and solver state kept for refit()
+		self.x = None
+		self.y = None
+		self._highs_state = None
+
+	# Function to choose which backend to use for a dataset of the given size
+	def select_backend(self, num_samples):
+		if self.backend != 'auto':
+			return self.backend
+		if num_samples <= auto_irls_samples:
+			return 'highs'
+		return 'irls'
+
+	# Function to fit the model to a (features x N) matrix x and length N vector y
+	def fit(self, x, y):
+		x = np.asarray(x, dtype=float)
+		y = np.asarray(y, dtype=float)
+		if x.ndim != 2 or x.shape[1] != y.shape[0]:
+			raise ValueError("x must be (features x N) and y must have length N, got %s and %s" % (x.shape, y.shape))
+
+		self.backend_used = self.select_backend(y.shape[0])
+		self.x = x
+		self.y = y
+
+		# A fresh fit never reuses the state of a previous one
+		self._highs_state = None
+
+		return self._solve()
+
+	# Function to re-optimize after new samples are appended and/or old ones removed (remove holds
+	# indices into the current training data)
+	# Only HiGHS is warm started: it keeps its LP (and simplex basis) and only has the changed columns
+	# swapped in (see warm_started). The cvxpy backend has to rebuild its problem, HiGHS without highspy
+	# can't be given a basis (scipy's linprog), and IRLS is re-solved cold too, since restarting it from
+	# the previous weights measured slower than a cold fit (refit_benchmark.py: 0.9x on average)
+	# With backend='auto' the backend is chosen again for the new number of samples, and a refit that
+	# crosses auto_irls_samples switches backend (solving cold with the new one)
+	def refit(self, x_new=None, y_new=None, remove=None):
+		if self.x is None:
+			raise RuntimeError("refit() called before fit()")
+
+		x = self.x
+		y = self.y
+		if remove is not None:
+			remove = np.unique(np.asarray(remove, dtype=int))
+			x = np.delete(x, remove, axis=1)
+			y = np.delete(y, remove)
+		if x_new is not None:
+			x_new = np.asarray(x_new, dtype=float)
+			y_new = np.asarray(y_new, dtype=float)
+			if x_new.ndim != 2 or x_new.shape[0] != x.shape[0] or x_new.shape[1] != y_new.shape[0]:
+				raise ValueError("x_new must be (%d x M) and y_new must have length M, got %s and %s" % (x.shape[0], x_new.shape, y_new.shape))
+			x = np.hstack([x, x_new])
+			y = np.concatenate([y, y_new])
+
+		backend = self.select_backend(y.shape[0])
+		if backend != self.backend_used:
+			self.backend_used = backend
+			self._highs_state = None
+		elif self._highs_state is not None:
+			self._update_highs(remove, x_new, y_new)
+
+		self.x = x
+		self.y = y
+		return self._solve()
+
+	# Function to return whether refit() re-optimizes from the previous solution rather than from scratch
+	def warm_started(self):
+		return self._highs_state is not None
+
+	# Function to solve the problem on the stored training data with the selected backend
+	def _solve(self):
+		start = time.perf_counter()
+		self.a, self.b, self.status = getattr(self, '_fit_' + self.backend_used)(self.x, self.y)
+		self.solve_time = time.perf_counter() - start
+
+		self.value = self.mean_error(self.x, self.y)
+		return self
+
+	# Function to return the predicted scores for a (features x N) matrix x
+	def predict(self, x):
+		return np.matmul(self.a, x) + self.b
+
+	# Function to return the mean absolute error of the model on (x, y)
+	def mean_error(self, x, y):
+		return np.mean(np.absolute(y - self.predict(x)))
+
+	def _fit_cvxpy(self, x, y):
+		prob, a, b = build_problem(x, y)
+		prob.solve()
+		return np.asarray(a.value), float(b.value), prob.status
+
+	def _fit_highs(self, x, y):
+		num_features, num_samples = x.shape
+
+		# Solve the dual of the L1 regression LP, which only has (features+1) equality constraints:
+		#     maximize  y^T d   s.t.   [x; 1] d = 0,   -1 <= d <= 1
+		# (the 1/N factor is dropped, it doesn't change the optimal a and b). The primal solution
+		# (a, b) is recovered from the equality constraint multipliers
+		try:
+			import highspy
+		except ImportError:
+			A_eq = np.vstack([x, np.ones(num_samples)])
+			res = linprog(-y, A_eq=A_eq, b_eq=np.zeros(num_features + 1), bounds=(-1.0, 1.0), method='highs')
+			if res.status != 0:
+				raise RuntimeError("HiGHS failed to solve the L1 regression LP: %s" % res.message)
+			w = -res.eqlin.marginals
+			return w[:-1], float(w[-1]), 'optimal'
+
+		# With highspy, keep the solver around so refit() can update the LP in place and re-solve
+		# from the previous basis. Every sample is one column of the dual LP
+		if self._highs_state is None:
+			h = highspy.Highs()
+			h.setOptionValue('output_flag', False)
+			h.addRows(num_features + 1, np.zeros(num_features + 1), np.zeros(num_features + 1), 0, np.zeros(1, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0))
+			self._highs_state = h
+			self._update_highs(None, x, y)
+
+		h = self._highs_state
+		h.run()
+		if h.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+			raise RuntimeError("HiGHS failed to solve the L1 regression LP: %s" % h.modelStatusToString(h.getModelStatus()))
+
+		w = -np.array(h.getSolution().row_dual)
+		return w[:-1], float(w[-1]), 'optimal'
+
+	# Function to remove and add sample columns of the dual LP held by highspy
+	def _update_highs(self, remove, x_new, y_new):
+		h = self._highs_state
+		if remove is not None and len(remove) > 0:
+			h.deleteCols(len(remove), remove.astype(np.int32))
+		if x_new is not None and x_new.shape[1] > 0:
+			num_new = x_new.shape[1]
+			cols = sp.csc_matrix(np.vstack([x_new, np.ones(num_new)]))
+			h.addCols(num_new, -y_new, -np.ones(num_new), np.ones(num_new), cols.nnz,
+					cols.indptr[:-1].astype(np.int32), cols.indices.astype(np.int32), cols.data)
+
+	def _fit_irls(self, x, y):
+		num_features, num_samples = x.shape
+
+		# Standardize the features so the normal equations stay well conditioned
+		# (density, for example, varies in the third decimal place only)
+		# w holds the standardized coefficients followed by the intercept
+		# The first iteration uses unit weights (i.e. ordinary least squares)
+		mean = np.mean(x, axis=1)
+		scale = np.std(x, axis=1)
+		scale[scale == 0] = 1.0
+		w = None
+		status = 'max_iter'
+		prev_value = np.inf
+		for i in range(self.max_iter):
+			gram = np.zeros((num_features + 1, num_features + 1))
+			rhs = np.zeros(num_features + 1)
+			value = 0.0
+
+			# Accumulate the weighted normal equations a block of samples at a time
+			for start in range(0, num_samples, irls_block_size):
+				xs = np.empty((num_features + 1, min(irls_block_size, num_samples - start)))
+				xs[:-1] = (x[:, start:start + xs.shape[1]] - mean[:, None]) / scale[:, None]
+				xs[-1] = 1.0
+				ys = y[start:start + xs.shape[1]]
+
+				if w is None:
+					weight = np.ones(ys.shape[0])
+				else:
+					dist = np.absolute(ys - np.matmul(w, xs))
+					value += np.sum(dist)
+					weight = 1.0 / np.maximum(dist, 1e-8)
+
+				gram += np.matmul(xs * weight, xs.T)
+				rhs += np.matmul(xs * weight, ys)
+
+			value = value / num_samples if w is not None else np.inf
+			w = np.linalg.solve(gram, rhs)
+
+			if prev_value - value <= self.tol * max(1.0, value):
+				status = 'optimal'
+				break
+			prev_value = value
+
+		a = w[:-1] / scale
+		b = w[-1] - np.dot(a, mean)
+		return a, float(b), status
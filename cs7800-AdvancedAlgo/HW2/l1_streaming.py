@@ -0,0 +1,191 @@
+#
+#   Out-of-core training for the L1 (mean absolute error) wine-quality regression
+#   Instead of building the LP, the model makes passes over a stream of (rows x 12) data chunks
+#   (e.g. from wine_data.iter_wine_chunks) and takes minibatch subgradient steps on
+#       (1/N) sum |y - a x - b|
+#   using either...
+#       - 'sgd':            subgradient descent with 1/sqrt(t) steps and an averaged iterate
+#       - 'dual_averaging': Nesterov's simple dual averaging, w_t = w_0 - sum(g) / (lr sqrt(t))
+#   The (a, b) state is checkpointed to a .npz file after every pass, so an interrupted run picks
+#   up from the last finished pass.
+#
+#   Usage: python l1_streaming.py [num_passes] [sgd|dual_averaging] [checkpoint.npz]
+#   (trains on wine_data.csv in small chunks and reports the gap to the exact LP optimum. The checkpoint
+#   defaults to l1_streaming_<method>.npz, and running again resumes after the last finished pass)
+#
+
+import os
+import sys
+import time
+import numpy as np
+
+
+class StreamingL1Regressor (object):
+	methods = ['sgd', 'dual_averaging']
+
+	def __init__ (self, method='sgd', lr=0.5, batch_size=32, checkpoint=None, seed=0):
+		if method not in self.methods:
+			raise ValueError("Unknown method '%s', expected one of: %s" % (method, ', '.join(self.methods)))
+		self.method = method
+		self.lr = lr
+		self.batch_size = batch_size
+		self.checkpoint = checkpoint
+		self.rng = np.random.RandomState(seed)
+
+		# Convergence trace, one (pass, steps, progressive MAE, seconds) entry per pass
+		self.trace = []
+
+		# Training state, kept between calls to fit() so that training can be continued
+		self.state = None
+
+		self.mean = None
+		self.scale = None
+		self.a = None
+		self.b = None
+
+	# Function to compute the feature standardization from one pass over the stream
+	# (the raw features differ in scale by four orders of magnitude, which subgradient steps can't handle)
+	def _fit_scaling(self, chunks):
+		count = 0
+		total = 0.0
+		total_sq = 0.0
+		for chunk in chunks():
+			chunk = np.asarray(chunk, dtype=float)
+			count += chunk.shape[0]
+			total = total + np.sum(chunk, axis=0)
+			total_sq = total_sq + np.sum(chunk*chunk, axis=0)
+
+		self.mean = total[:-1] / count
+		self.scale = np.sqrt(np.maximum(total_sq[:-1] / count - self.mean**2, 0))
+		self.scale[self.scale == 0] = 1.0
+
+		# Return the mean score, which is used as the starting intercept
+		return total[-1] / count
+
+	# Function to save the training state after a finished pass
+	def _save(self, state):
+		np.savez(self.checkpoint + '.tmp.npz', mean=self.mean, scale=self.scale, trace=np.array(self.trace), **state)
+		os.replace(self.checkpoint + '.tmp.npz', self.checkpoint)
+
+	# Function to restore the training state saved by _save, if there is one
+	def _load(self):
+		if self.checkpoint is None or not os.path.exists(self.checkpoint):
+			return None
+		saved = np.load(self.checkpoint)
+		self.mean = saved['mean']
+		self.scale = saved['scale']
+		self.trace = [tuple(row) for row in saved['trace']]
+		return {key: saved[key] for key in ['w0', 'w', 'w_avg', 'g_sum', 'steps', 'passes']}
+
+	# Function to train on a stream of data, until num_passes passes have been made in total
+	# chunks must be a callable that returns a fresh iterator of (rows x 12) arrays for every pass
+	def fit(self, chunks, num_passes=10):
+		state = self.state if self.state is not None else self._load()
+		if state is None:
+			# Start from the standardized origin, with the intercept at the mean score
+			mean_score = self._fit_scaling(chunks)
+			w0 = np.zeros(self.mean.shape[0] + 1)
+			w0[-1] = mean_score
+			state = {'w0': w0, 'w': w0, 'w_avg': w0, 'g_sum': np.zeros(w0.shape[0]), 'steps': 0, 'passes': 0}
+		self.state = state
+
+		w0 = state['w0']
+		w = state['w']
+		w_avg = state['w_avg']
+		g_sum = state['g_sum']
+		steps = int(state['steps'])
+
+		for p in range(int(state['passes']), num_passes):
+			start_time = time.perf_counter()
+			count = 0
+			loss = 0.0
+
+			# The returned model is the average of the iterates over the latest pass
+			# (averaging over every pass would keep dragging in the poor early iterates)
+			pass_steps = 0
+
+			for chunk in chunks():
+				# Shuffle the rows within each chunk, since streams are usually in some sorted order
+				chunk = np.asarray(chunk, dtype=float)[self.rng.permutation(chunk.shape[0])]
+
+				for start in range(0, chunk.shape[0], self.batch_size):
+					batch = chunk[start:start + self.batch_size]
+					xs = np.empty((batch.shape[0], w.shape[0]))
+					xs[:, :-1] = (batch[:, :-1] - self.mean) / self.scale
+					xs[:, -1] = 1.0
+
+					residual = batch[:, -1] - np.matmul(xs, w)
+					count += batch.shape[0]
+					loss += np.sum(np.absolute(residual))
+
+					# Subgradient of the minibatch mean absolute error
+					g = -np.matmul(np.sign(residual), xs) / batch.shape[0]
+					steps += 1
+					pass_steps += 1
+
+					if self.method == 'sgd':
+						w = w - (self.lr / np.sqrt(steps)) * g
+					else:
+						g_sum = g_sum + g
+						w = w0 - g_sum / (self.lr * np.sqrt(steps))
+
+					# Running average of the iterates, which is what the subgradient guarantees apply to
+					w_avg = w_avg + (w - w_avg) / pass_steps
+
+			self.trace.append((p + 1, steps, loss / count, time.perf_counter() - start_time))
+
+			self.state = {'w0': w0, 'w': w, 'w_avg': w_avg, 'g_sum': g_sum, 'steps': steps, 'passes': p + 1}
+			if self.checkpoint is not None:
+				self._save(self.state)
+
+		self._set_coefficients(w_avg)
+		return self
+
+	# Function to convert standardized weights back to coefficients on the raw features
+	def _set_coefficients(self, w):
+		self.a = w[:-1] / self.scale
+		self.b = float(w[-1] - np.dot(self.a, self.mean))
+
+	# Function to return the predicted scores for a (features x N) matrix x
+	def predict(self, x):
+		return np.matmul(self.a, x) + self.b
+
+	# Function to return the mean absolute error of the model over a stream of data
+	def mean_error(self, chunks):
+		count = 0
+		total = 0.0
+		for chunk in chunks():
+			total += np.sum(np.absolute(chunk[:, -1] - self.predict(np.asarray(chunk[:, :-1]).T)))
+			count += chunk.shape[0]
+		return total / count
+
+
+if __name__ == '__main__':
+	from wine_data import load_wine_data, iter_wine_chunks
+	from l1_regressor import L1Regressor
+
+	num_passes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+	method = sys.argv[2] if len(sys.argv) > 2 else 'sgd'
+	checkpoint = sys.argv[3] if len(sys.argv) > 3 else 'l1_streaming_%s.npz' % method
+
+	# Stream the 1,599-row sample dataset in small chunks, as if it didn't fit in memory
+	chunks = lambda: iter_wine_chunks("wine_data.csv", rows=200)
+
+	# Exact LP optimum on the full dataset, for reference
+	data = load_wine_data("wine_data.csv")
+	exact = L1Regressor('highs').fit(np.array(data[:, :-1]).T, np.array(data[:, -1]))
+	print("\nExact LP optimum (HiGHS): %.8f\n" % exact.value)
+
+	model = StreamingL1Regressor(method=method, checkpoint=checkpoint)
+
+	# Restore the checkpoint (if there is one) without making any pass, and carry on after its last pass
+	model.fit(chunks, num_passes=0)
+	if model.trace:
+		print("Resuming from %s after pass %d" % (checkpoint, len(model.trace)))
+
+	print('{0:>6} {1:>8} {2:>16} {3:>14} {4:>12} {5:>10}'.format('Pass', 'Steps', 'Progressive MAE', 'Averaged MAE', 'Gap', 'Time (s)'))
+	for p in range(len(model.trace) + 1, num_passes + 1):
+		model.fit(chunks, num_passes=p)
+		_, steps, progressive, seconds = model.trace[-1]
+		value = model.mean_error(chunks)
+		print('{0:>6} {1:>8} {2:>16.8f} {3:>14.8f} {4:>12.8f} {5:>10.4f}'.format(p, steps, progressive, value, value - exact.value, seconds))
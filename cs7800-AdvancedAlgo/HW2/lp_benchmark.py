@@ -0,0 +1,59 @@
+#
+#   Benchmark for the L1 wine-quality regression LP
+#   Compares the time taken to build (construct + canonicalize) and to solve the original per-row
+#   formulation against the vectorized matrix formulation, for increasing numbers of samples.
+#   Larger sample counts are made by resampling rows of wine_data.csv (with a little noise).
+#
+#   Usage: python lp_benchmark.py [max_per_row_samples]
+#
+
+import sys
+import time
+import numpy as np
+
+from wine_quality import load_data, format_data, num_train_samples, build_problem_per_row
+from l1_regressor import build_problem
+
+
+# Sample counts to benchmark (the per-row formulation is skipped past max_per_row_samples,
+# since building it quickly becomes the bulk of the benchmark run time)
+sample_sizes = [1500, 5000, 20000, 100000, 300000]
+
+
+# Function to make an 11xN design matrix and N targets by resampling the real data
+def resample(x, y, num_samples, seed=0):
+	rng = np.random.RandomState(seed)
+	ind = rng.randint(0, x.shape[1], num_samples)
+	x_big = x[:, ind] * (1 + 0.01*rng.randn(x.shape[0], num_samples))
+	return x_big, y[ind]
+
+
+# Function to build and solve a problem, returning (build time, canonicalization time, solve time, value)
+def time_problem(builder, x, y):
+	start = time.perf_counter()
+	prob, a, b = builder(x, y)
+	build_time = time.perf_counter() - start
+
+	start = time.perf_counter()
+	prob.solve()
+	total_solve_time = time.perf_counter() - start
+
+	# cvxpy reports how much of the solve() call was spent compiling the problem for the solver
+	compile_time = prob.compilation_time
+	return build_time, compile_time, total_solve_time - compile_time, prob.value
+
+
+if __name__ == '__main__':
+	max_per_row = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+	x, y = format_data(load_data(), 0, num_train_samples)
+
+	print('{0:>8} {1:>10} {2:>10} {3:>12} {4:>10} {5:>12}'.format('N', 'Form', 'Build (s)', 'Compile (s)', 'Solve (s)', 'Value'))
+	for n in sample_sizes:
+		x_n, y_n = (x, y) if n == num_train_samples else resample(x, y, n)
+
+		for name, builder in [('per-row', build_problem_per_row), ('matrix', build_problem)]:
+			if name == 'per-row' and n > max_per_row:
+				continue
+			build_time, compile_time, solve_time, value = time_problem(builder, x_n, y_n)
+			print('{0:>8} {1:>10} {2:>10.3f} {3:>12.3f} {4:>10.3f} {5:>12.6f}'.format(n, name, build_time, compile_time, solve_time, value))
@@ -0,0 +1,41 @@
+#
+#   Benchmark for L1Regressor.refit() against solving from scratch
+#   Fits the first num_train_samples rows, then repeatedly appends the next batch of new rows (and
+#   drops the oldest few), timing refit() against a cold fit on the same data. Only HiGHS (with highspy)
+#   is warm started by refit(), the other backends re-solve from scratch and are listed as 'cold' for
+#   reference.
+#
+#   Usage: python refit_benchmark.py [rows_per_update] [rows_removed_per_update]
+#
+
+import sys
+import numpy as np
+
+from wine_quality import load_data, format_data, num_train_samples
+from l1_regressor import L1Regressor
+
+
+if __name__ == '__main__':
+	num_new = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+	num_removed = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+	data = load_data()
+	x, y = format_data(data, 0, num_train_samples)
+
+	print('{0:>7} {1:>7} {2:>11} {3:>11} {4:>9} {5:>14}'.format('Backend', 'Rows', 'Refit (s)', 'Cold (s)', 'Speedup', 'Objective gap'))
+	for backend in L1Regressor.backends:
+		model = L1Regressor(backend).fit(x, y)
+
+		refit_times = []
+		cold_times = []
+		for start in range(num_train_samples, data.shape[0], num_new):
+			x_new, y_new = format_data(data, start, min(start + num_new, data.shape[0]))
+			model.refit(x_new, y_new, remove=np.arange(num_removed))
+
+			cold = L1Regressor(backend).fit(model.x, model.y)
+			refit_times.append(model.solve_time)
+			cold_times.append(cold.solve_time)
+
+			print('{0:>7} {1:>7} {2:>11.4f} {3:>11.4f} {4:>8.1f}x {5:>14.2e}'.format(backend, model.y.shape[0], model.solve_time, cold.solve_time, cold.solve_time / model.solve_time, model.value - cold.value))
+
+		print('{0:>7} {1:>7} {2:>11.4f} {3:>11.4f} {4:>8.1f}x   ({5} refit)\n'.format(backend, 'mean', np.mean(refit_times), np.mean(cold_times), np.mean(cold_times) / np.mean(refit_times), 'warm' if model.warm_started() else 'cold'))
@@ -0,0 +1,108 @@
+#
+#   Parallel k-fold cross-validation and learning curve for the L1 wine-quality regression
+#   Every fold and every training size is an independent fit, so they are spread over a process
+#   pool. The parsed dataset is placed in one shared memory block that all the workers attach to,
+#   rather than each worker re-reading the data.
+#       - Cross-validation: all rows are shuffled and split into k folds
+#       - Learning curve: models are trained on the first n rows of a shuffled training set
+#         (the first num_train_samples rows) and tested on the remaining rows, as in wine_quality.py
+#   Results are printed as one table of train/test mean absolute error and percent error.
+#
+#   Usage: python wine_cv.py [k] [backend] [num_workers]
+#
+
+import os
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from wine_data import load_wine_data
+from wine_quality import num_train_samples, get_error
+from l1_regressor import L1Regressor
+
+
+# Training set sizes used for the learning curve
+train_sizes = [50, 100, 200, 400, 800, 1200, num_train_samples]
+
+# Data attached by each worker process (see attach_data)
+worker_data = None
+worker_shm = None
+
+
+# Function to copy the dataset into a new shared memory block
+def share_data(data):
+	shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+	shared = np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)
+	shared[:] = data
+	return shm, shared
+
+
+# Function run once in every worker process to attach to the shared dataset
+def attach_data(name, shape, dtype):
+	global worker_data, worker_shm
+	worker_shm = shared_memory.SharedMemory(name=name)
+	worker_data = np.ndarray(shape, dtype=dtype, buffer=worker_shm.buf)
+
+
+# Function run in a worker to fit one model and return its train and test errors
+def run_task(task):
+	kind, label, train_ind, test_ind, backend = task
+
+	x = worker_data[train_ind, :-1].T
+	y = worker_data[train_ind, -1]
+	x_test = worker_data[test_ind, :-1].T
+	y_test = worker_data[test_ind, -1]
+
+	model = L1Regressor(backend).fit(x, y)
+	train_err, train_err_percent = get_error(model.a, model.b, x, y)
+	test_err, test_err_percent = get_error(model.a, model.b, x_test, y_test)
+
+	return kind, label, len(train_ind), train_err, train_err_percent, test_err, test_err_percent
+
+
+# Function to make the cross-validation and learning curve tasks
+def make_tasks(num_samples, k, backend, seed=0):
+	rng = np.random.RandomState(seed)
+	tasks = []
+
+	perm = rng.permutation(num_samples)
+	folds = np.array_split(perm, k)
+	for i in range(k):
+		train_ind = np.concatenate(folds[:i] + folds[i+1:])
+		tasks.append(('cv', 'fold %d/%d' % (i + 1, k), train_ind, folds[i], backend))
+
+	perm = rng.permutation(num_train_samples)
+	test_ind = np.arange(num_train_samples, num_samples)
+	for n in train_sizes:
+		tasks.append(('curve', 'n = %d' % n, perm[:n], test_ind, backend))
+
+	return tasks
+
+
+if __name__ == '__main__':
+	k = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+	backend = sys.argv[2] if len(sys.argv) > 2 else 'auto'
+	num_workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+
+	data = load_wine_data()
+	shm, shared = share_data(data)
+
+	try:
+		tasks = make_tasks(data.shape[0], k, backend)
+		with ProcessPoolExecutor(max_workers=num_workers, initializer=attach_data, initargs=(shm.name, shared.shape, shared.dtype)) as pool:
+			results = list(pool.map(run_task, tasks))
+	finally:
+		del shared
+		shm.close()
+		shm.unlink()
+
+	print('\n{0:>6} {1:>12} {2:>7} {3:>11} {4:>11} {5:>11} {6:>11}'.format('Kind', 'Run', 'Train N', 'Train MAE', 'Train %', 'Test MAE', 'Test %'))
+	for kind in ['cv', 'curve']:
+		rows = [r for r in results if r[0] == kind]
+		for r in rows:
+			print('{0:>6} {1:>12} {2:>7} {3:>11.6f} {4:>10.4f}% {5:>11.6f} {6:>10.4f}%'.format(*r))
+		if kind == 'cv':
+			means = np.mean([r[3:] for r in rows], axis=0)
+			print('{0:>6} {1:>12} {2:>7} {3:>11.6f} {4:>10.4f}% {5:>11.6f} {6:>10.4f}%'.format(kind, 'mean', '', *means))
+		print('')
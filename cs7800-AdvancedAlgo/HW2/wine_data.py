@@ -0,0 +1,97 @@
+#
+#   Columnar loader for the semicolon separated wine quality data
+#   The .csv file is parsed once, in chunks of rows, straight into a contiguous (samples x 12) float
+#   array that is cached as a .npy file next to the .csv. Later runs memory-map the cache instead of
+#   parsing the .csv again, and the cache is rebuilt whenever the .csv is newer than it.
+#   Columns are the 11 wine features followed by the quality score.
+#
+
+import os
+import numpy as np
+
+
+# Number of .csv rows parsed at a time, so multi-gigabyte exports never need to fit in memory
+chunk_rows = 262144
+
+
+# Function to return the path of the binary cache for a given .csv file
+def cache_path(filename):
+	return os.path.splitext(filename)[0] + '.npy'
+
+
+# Function to count the data rows (i.e. non-empty lines after the header) in a .csv file
+def count_rows(filename):
+	num_lines = 0
+	last = b'\n'
+	with open(filename, 'rb') as input_file:
+		for block in iter(lambda: input_file.read(1 << 24), b''):
+			num_lines += block.count(b'\n')
+			last = block[-1:]
+
+	# Count a final line that has no trailing newline, then drop the header
+	if last != b'\n':
+		num_lines += 1
+	return num_lines - 1
+
+
+# Function to parse a list of .csv lines into a (lines x columns) float array
+def parse_lines(lines, num_columns):
+	values = np.array(b';'.join(line.strip() for line in lines).split(b';'), dtype=float)
+	return values.reshape(-1, num_columns)
+
+
+# Function to parse the .csv file into the .npy cache, one chunk of rows at a time
+def build_cache(filename):
+	num_rows = count_rows(filename)
+	path = cache_path(filename)
+	tmp_path = path + '.tmp'
+
+	with open(filename, 'rb') as input_file:
+		# fieldnames = ['fixed_acidity', 'volatile_acidity', 'citric_acid', 'residual_sugar', 'chlorides', 'free_sulfur_dioxide', 'total_sulfur_dioxide', 'density', 'pH', 'sulphates', 'alcohol', 'quality']
+		num_columns = len(input_file.readline().split(b';'))
+
+		data = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(num_rows, num_columns))
+
+		row = 0
+		lines = []
+		for line in input_file:
+			if line.strip():
+				lines.append(line)
+			if len(lines) == chunk_rows:
+				data[row:row + len(lines)] = parse_lines(lines, num_columns)
+				row += len(lines)
+				lines = []
+		if lines:
+			data[row:row + len(lines)] = parse_lines(lines, num_columns)
+			row += len(lines)
+
+		data.flush()
+		del data
+
+	# Blank lines in the file leave unfilled rows at the end, so copy out only the parsed rows
+	if row != num_rows:
+		data = np.load(tmp_path, mmap_mode='r')
+		with open(tmp_path + '.trim', 'wb') as output_file:
+			np.save(output_file, data[:row])
+		del data
+		os.replace(tmp_path + '.trim', tmp_path)
+
+	# Only replace the cache once it is complete, so an interrupted parse is never picked up
+	os.replace(tmp_path, path)
+	return path
+
+
+# Function to load the wine data as a read-only, memory-mapped (samples x 12) float array
+def load_wine_data(filename="wine_data.csv"):
+	path = cache_path(filename)
+	if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(filename):
+		build_cache(filename)
+
+	return np.load(path, mmap_mode='r')
+
+
+# Function to iterate over the wine data in (rows x 12) chunks, without loading all of it
+def iter_wine_chunks(filename="wine_data.csv", rows=chunk_rows):
+	data = load_wine_data(filename)
+	for start in range(0, data.shape[0], rows):
+		yield data[start:start + rows]
@@ -1,115 +1,101 @@
 import cvxpy as cvx
 import numpy as np
-import csv
+import sys
 from cvxpy.atoms.affine.binary_operators import MulExpression
 
+from l1_regressor import L1Regressor
+from wine_data import load_wine_data
 
-# Import the data from the .csv file
-with open("wine_data.csv", newline='') as input_file: 
-	# fieldnames = ['fixed_acidity', 'volatile_acidity', 'citric_acid', 'residual_sugar', 'chlorides', 'free_sulfur_dioxide', 'total_sulfur_dioxide', 'density', 'pH', 'sulphates', 'alcohol', 'quality']
-	reader = csv.DictReader(input_file, delimiter=';')
-	data = []
-	for row in reader: 
-		data.append(row)
-
-x = []
-y = []
 
 # Define the number of training samples
 num_train_samples = 1500
 
-# Format the training data into 1x1500 array y and 11x1500 matrix x 
-for i in range(num_train_samples):
-
-	train_row = list(data[i].values())
-
-	y.append(float(train_row[len(train_row)-1]))
-
-	train_row = np.array([train_row[0:len(train_row)-1]])
-	train_row = np.transpose(train_row)
-
-	x.append(train_row)
-
-x = np.array(x).astype(float)
-x = np.squeeze(x)
-x = np.transpose(x)
-
 
-# Create three optimization variables
-a = cvx.Variable((1,11))
-b = cvx.Variable()
-z = cvx.Variable(num_train_samples)
+# Function to import the data from the .csv file, as a (samples x 12) array
+# The first run parses the .csv into a cached wine_data.npy, later runs just memory-map that
+def load_data(filename="wine_data.csv"):
+	return load_wine_data(filename)
 
-# Create the LP constraints
-constraints = []
 
-for j in range(num_train_samples):
-	constraints += [y[j]- MulExpression(a,x[:,j]) - b <= z[j], 
-					y[j]- MulExpression(a,x[:,j]) - b >= -z[j]]
+# Function to format rows [start, stop) of the data into a 1xN array y and an 11xN matrix x
+def format_data(data, start, stop):
+	x = np.array(data[start:stop, :-1]).T
+	y = np.array(data[start:stop, -1])
 
+	return x, y
 
-# Form the objective
-obj = cvx.Minimize((1/num_train_samples)*sum(z))
 
-# Form and solve the problem
-prob = cvx.Problem(obj, constraints)
-prob.solve()  
+# Function to build the original LP, with two scalar constraints per training sample
+# This is kept around only as a reference point for lp_benchmark.py (see l1_regressor.py for the
+# vectorized version that is actually used)
+def build_problem_per_row(x, y):
+	num_samples = x.shape[1]
 
-# Print the optimization results 
-print("\nstatus:", prob.status)
-print("optimal value", prob.value)
-print("optimal var", a.value, b.value, "\n")
+	# Create three optimization variables
+	a = cvx.Variable((1,11))
+	b = cvx.Variable()
+	z = cvx.Variable(num_samples)
 
-a_opt = a.value
-b_opt = b.value
+	# Create the LP constraints
+	constraints = []
 
-# Calculate the distance between the predicted score value (using optimization results) and the 
-# actual score value for all of the training data
-dist_train = np.absolute(y - np.matmul(a_opt,x) - b_opt)
+	for j in range(num_samples):
+		constraints += [y[j]- MulExpression(a,x[:,j]) - b <= z[j],
+						y[j]- MulExpression(a,x[:,j]) - b >= -z[j]]
 
-# Calculate the average training error (both as a value and as a percent)
-avg_training_err = (1/num_train_samples)*np.sum(dist_train)
-avg_training_err_percent = (1/num_train_samples)*np.sum(np.divide(dist_train,y))*100
+	# Form the objective
+	obj = cvx.Minimize((1/num_samples)*sum(z))
 
-# Print the training error results
-print("The average training error is %.8f" % avg_training_err)
-print("The average training error percent is %.4f%%\n" % avg_training_err_percent)
+	return cvx.Problem(obj, constraints), a, b
 
 
-x_test = []
-y_test = []
+# Function to calculate the average error (both as a value and as a percent) of the predicted
+# score values against the actual score values
+def get_error(a_opt, b_opt, x, y):
+	num_samples = len(y)
 
-# Format the test data into 1x99 array y and 11x99 matrix x 
-for k in range(num_train_samples,len(data)):
+	# Calculate the distance between the predicted score value (using optimization results) and the
+	# actual score value for all of the data
+	dist = np.absolute(y - np.matmul(a_opt,x) - b_opt)
 
-	test_row = list(data[k].values())
+	avg_err = (1/num_samples)*np.sum(dist)
+	avg_err_percent = (1/num_samples)*np.sum(np.divide(dist,y))*100
 
-	y_test.append(float(test_row[len(test_row)-1]))
+	return avg_err, avg_err_percent
 
-	test_row = np.array([test_row[0:len(test_row)-1]])
-	test_row = np.transpose(test_row)
 
-	x_test.append(test_row)
+if __name__ == '__main__':
+	data = load_data()
 
-x_test = np.array(x_test).astype(float)
-x_test = np.squeeze(x_test)
-x_test = np.transpose(x_test)
+	# Format the training data into 1x1500 array y and 11x1500 matrix x
+	x, y = format_data(data, 0, num_train_samples)
 
-# Define the number of test samples
-num_test_samples = len(y_test)
+	# Fit the L1 regression, optionally with a specific solver backend (cvxpy, highs or irls)
+	backend = sys.argv[1] if len(sys.argv) > 1 else 'auto'
+	model = L1Regressor(backend).fit(x, y)
 
-# Calculate the distance between the predicted score value (using optimization results) and the 
-# actual score value for all of the test data
-dist_test = np.absolute(y_test - np.matmul(a_opt,x_test) - b_opt)
+	# Print the optimization results
+	print("\nbackend:", model.backend_used)
+	print("status:", model.status)
+	print("optimal value", model.value)
+	print("optimal var", model.a, model.b, "\n")
 
-# Calculate the average test error (both as a value and as a percent)
-avg_test_err = (1/num_test_samples)*np.sum(dist_test)
-avg_test_err_percent = (1/num_test_samples)*np.sum(np.divide(dist_test,y_test))*100
+	a_opt = model.a
+	b_opt = model.b
 
-# Print the test error results
-print("The average test error is %.8f" % avg_test_err)
-print("The average test error percent is %.4f%%\n" % avg_test_err_percent)
+	# Calculate the average training error
+	avg_training_err, avg_training_err_percent = get_error(a_opt, b_opt, x, y)
 
+	# Print the training error results
+	print("The average training error is %.8f" % avg_training_err)
+	print("The average training error percent is %.4f%%\n" % avg_training_err_percent)
 
+	# Format the test data into 1x99 array y and 11x99 matrix x
+	x_test, y_test = format_data(data, num_train_samples, len(data))
 
+	# Calculate the average test error
+	avg_test_err, avg_test_err_percent = get_error(a_opt, b_opt, x_test, y_test)
 
+	# Print the test error results
+	print("The average test error is %.8f" % avg_test_err)
+	print("The average test error percent is %.4f%%\n" % avg_test_err_percent)
@@ -0,0 +1,142 @@
+#
+#   Batch, color, low-rank compression of every image in a directory
+#   Unlike svd_compression.py, the three color channels are kept, either...
+#       - 'per_channel': one rank k factorization per channel, saved as a 3-channel .lrim file
+#                        (see lowrank_format.py)
+#       - 'stacked':     one rank k factorization of the channels side by side (m x 3n), so the three
+#                        channels share U_k. Saved as a .lrim file with the 'stacked' layout (the shared
+#                        U_k, s_k and each channel's columns of V_k)
+#   Images are spread across a pool of worker processes. Each worker's BLAS is limited to its share of
+#   the cores, so the workers don't oversubscribe the machine. Per-image timings are written to
+#   manifest.csv in the output directory. An image that fails (e.g. a file cv2 can't read) gets a row
+#   with its error in the status column, and the rest of the directory is still compressed.
+#   Each output keeps the full input file name (photo.jpg -> photo.jpg.lrim), so inputs with the same
+#   stem don't overwrite each other.
+#
+#   Usage: python batch_compression.py input_dir output_dir [rank] [per_channel|stacked] [num_workers]
+#
+
+import os
+import sys
+import csv
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Environment variables read by the common BLAS libraries when numpy is first imported
+blas_thread_vars = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS']
+
+# File extensions picked up from the input directory
+image_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+manifest_fields = ['file', 'status', 'height', 'width', 'mode', 'rank', 'read_s', 'svd_s', 'write_s', 'total_s', 'input_bytes', 'output_bytes', 'psnr_db']
+
+
+modes = ['per_channel', 'stacked']
+
+
+# Function run in a worker to compress one color image, returning its manifest row
+# Any failure is reported in the row's status instead of being raised, so one bad file doesn't
+# abort the whole directory
+def compress_image(task):
+	try:
+		return compress_one(task)
+	except Exception as e:
+		return {'file': os.path.basename(task[0]), 'status': 'error: %s' % e, 'mode': task[3], 'rank': task[2]}
+
+
+# Function to compress one color image, returning its manifest row
+def compress_one(task):
+	import cv2
+	import lowrank_format
+	from truncated_svd import truncated_svd
+	from svd_compression import psnr
+
+	input_name, output_dir, k, mode = task
+	name = os.path.basename(input_name)
+
+	start = time.perf_counter()
+	image = cv2.imread(input_name, cv2.IMREAD_COLOR)
+	if image is None:
+		raise ValueError("Could not read image %s" % input_name)
+	m, n, channels = image.shape
+	r = min(k, m, n)
+	read_time = time.perf_counter()
+
+	if mode == 'per_channel':
+		factors = [truncated_svd(image[:, :, c], r) for c in range(channels)]
+		svd_time = time.perf_counter()
+
+		output_name = os.path.join(output_dir, name + '.lrim')
+		lowrank_format.save(output_name, factors)
+		approx = lowrank_format.load(output_name)
+	elif mode == 'stacked':
+		u, s, v = truncated_svd(image.transpose(0, 2, 1).reshape(m, channels*n), r)
+		svd_time = time.perf_counter()
+
+		output_name = os.path.join(output_dir, name + '.lrim')
+		lowrank_format.save(output_name, [(u, s, v)], layout='stacked', channels=channels)
+		approx = lowrank_format.load(output_name)
+	else:
+		raise ValueError("Unknown mode '%s', expected per_channel or stacked" % mode)
+	end = time.perf_counter()
+
+	return {'file': os.path.basename(input_name), 'status': 'ok', 'height': m, 'width': n, 'mode': mode, 'rank': r,
+			'read_s': '%.4f' % (read_time - start), 'svd_s': '%.4f' % (svd_time - read_time), 'write_s': '%.4f' % (end - svd_time),
+			'total_s': '%.4f' % (end - start), 'input_bytes': os.path.getsize(input_name), 'output_bytes': os.path.getsize(output_name),
+			'psnr_db': '%.2f' % psnr(image, approx)}
+
+
+# Function to compress every image in input_dir into output_dir, returning the manifest rows
+def compress_directory(input_dir, output_dir, k=50, mode='per_channel', num_workers=None):
+	if mode not in modes:
+		raise ValueError("Unknown mode '%s', expected one of: %s" % (mode, ', '.join(modes)))
+	files = sorted(os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.lower().endswith(image_extensions))
+	if not os.path.isdir(output_dir):
+		os.makedirs(output_dir)
+
+	num_workers = num_workers or os.cpu_count()
+
+	# Spawned workers start a fresh interpreter and import numpy after inheriting these variables,
+	# so every worker's BLAS only uses its share of the cores
+	threads = str(max(1, os.cpu_count() // num_workers))
+	saved = {var: os.environ.get(var) for var in blas_thread_vars}
+	os.environ.update({var: threads for var in blas_thread_vars})
+	try:
+		ctx = multiprocessing.get_context('spawn')
+		with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx) as pool:
+			rows = list(pool.map(compress_image, [(f, output_dir, k, mode) for f in files]))
+	finally:
+		for var, value in saved.items():
+			if value is None:
+				os.environ.pop(var, None)
+			else:
+				os.environ[var] = value
+
+	with open(os.path.join(output_dir, 'manifest.csv'), 'w', newline='') as manifest_file:
+		writer = csv.DictWriter(manifest_file, fieldnames=manifest_fields)
+		writer.writeheader()
+		writer.writerows(rows)
+
+	return rows
+
+
+if __name__ == '__main__':
+	if len(sys.argv) < 3:
+		print("\nNot a valid argument, please use an argument in the following format...")
+		print("python batch_compression.py input_dir output_dir [rank] [per_channel|stacked] [num_workers]\n")
+		sys.exit(1)
+
+	k = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+	mode = sys.argv[4] if len(sys.argv) > 4 else 'per_channel'
+	num_workers = int(sys.argv[5]) if len(sys.argv) > 5 else None
+
+	start = time.perf_counter()
+	rows = compress_directory(sys.argv[1], sys.argv[2], k, mode, num_workers)
+	seconds = time.perf_counter() - start
+
+	failed = [row for row in rows if row['status'] != 'ok']
+	print("\nCompressed %d images in %.3f s (%.2f images/s)" % (len(rows) - len(failed), seconds, len(rows) / seconds if seconds > 0 else 0))
+	for row in failed:
+		print("Failed: %s (%s)" % (row['file'], row['status']))
+	print("Per-image timings written to %s\n" % os.path.join(sys.argv[2], 'manifest.csv'))
@@ -0,0 +1,57 @@
+#
+#   Benchmark for the low-rank image container in lowrank_format.py
+#   For each rank, the image is stored as float16 and int8 factors, and the rank k approximation is
+#   also saved as PNG and JPEG (the way svd_compression.py stores it). The size on disk, decode time
+#   and PSNR against the original of every format are reported, along with a lower-rank partial
+#   decode of the int8 file.
+#
+#   Usage: python format_benchmark.py [rank ...]
+#
+
+import sys
+import time
+import cv2
+
+import lowrank_format
+from truncated_svd import truncated_svd
+from svd_compression import reconstruct, to_image, psnr
+
+
+# Number of decodes averaged for each timing
+num_repeats = 20
+
+
+# Function to return the mean time (in seconds) of num_repeats calls of fn
+def time_decode(fn):
+	start = time.perf_counter()
+	for i in range(num_repeats):
+		fn()
+	return (time.perf_counter() - start) / num_repeats
+
+
+if __name__ == '__main__':
+	ranks = [int(a) for a in sys.argv[1:]] or [10, 50, 100]
+
+	grayImage = cv2.cvtColor(cv2.imread('prudential.jpg'), cv2.COLOR_BGR2GRAY)
+	u, s, v = truncated_svd(grayImage, max(ranks))
+
+	print('\n{0:>5} {1:>16} {2:>10} {3:>13} {4:>10}'.format('Rank', 'Format', 'Bytes', 'Decode (ms)', 'PSNR (dB)'))
+	for k in ranks:
+		factors = [(u[:, :k], s[:k], v[:k, :])]
+		approx = to_image(reconstruct(u, s, v, k))
+
+		results = []
+		for dtype in ['float16', 'int8']:
+			buf = lowrank_format.encode(factors, dtype)
+			results.append(('lrim ' + dtype, len(buf), time_decode(lambda: lowrank_format.decode(buf)), lowrank_format.decode(buf)))
+
+		# Partial decode of the int8 file at half the stored rank
+		results.append(('lrim int8 r=%d' % (k//2), len(buf), time_decode(lambda: lowrank_format.decode(buf, k//2)), lowrank_format.decode(buf, k//2)))
+
+		for ext, params in [('.png', []), ('.jpg', [cv2.IMWRITE_JPEG_QUALITY, 90])]:
+			encoded = cv2.imencode(ext, approx, params)[1]
+			results.append((ext[1:], encoded.nbytes, time_decode(lambda: cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE)), cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE)))
+
+		for name, num_bytes, seconds, image in results:
+			print('{0:>5} {1:>16} {2:>10} {3:>13.3f} {4:>10.2f}'.format(k, name, num_bytes, 1000*seconds, psnr(grayImage, image)))
+		print('')
@@ -0,0 +1,75 @@
+#
+#   Incremental (streaming) rank k SVD, in the style of Brand's incremental SVD
+#   A rank k factorization U_k diag(s_k) V_k of a matrix that grows one block of columns at a time is
+#   kept up to date without ever refactorizing the whole matrix. For a new block C...
+#       M = U^T C,   P = C - U M = J K   (QR of the part of C outside the current basis)
+#       [diag(s)  M]
+#       [   0     K]  = U' diag(s') V'^T      (a small (k + c) x (k + c) SVD)
+#       U <- [U J] U'_k,   s <- s'_k,   V <- blockdiag(V, I) V'_k
+#   so every update costs O(d k (k + c)) for d rows, rather than a full SVD of everything seen so far.
+#
+
+import numpy as np
+
+
+class IncrementalSVD (object):
+	# k is the rank kept, store_v keeps the right singular vectors (one row per column seen), and the
+	# basis is re-orthonormalized every reorthogonalize updates to stop rounding errors building up
+	def __init__ (self, k, store_v=False, reorthogonalize=50):
+		self.k = k
+		self.store_v = store_v
+		self.reorthogonalize = reorthogonalize
+
+		self.u = None
+		self.s = None
+		self.v = None
+		self.num_updates = 0
+
+	# Function to add a block of columns (d x c, or a single length d column)
+	def update(self, C):
+		C = np.asarray(C, dtype=np.float64)
+		if C.ndim == 1:
+			C = C[:, None]
+
+		if self.u is None:
+			u, s, v = np.linalg.svd(C, full_matrices=False)
+			r = min(self.k, s.shape[0])
+			self.u = u[:, :r]
+			self.s = s[:r]
+			self.v = v[:r, :].T if self.store_v else None
+			self.num_updates = 1
+			return self
+
+		r = self.s.shape[0]
+		c = C.shape[1]
+
+		M = np.matmul(self.u.T, C)
+		P = C - np.matmul(self.u, M)
+		J, K = np.linalg.qr(P)
+
+		Q = np.zeros((r + c, r + c))
+		Q[:r, :r] = np.diag(self.s)
+		Q[:r, r:] = M
+		Q[r:, r:] = K
+		u_q, s_q, v_q = np.linalg.svd(Q)
+
+		new_r = min(self.k, r + c)
+		self.u = np.matmul(self.u, u_q[:r, :new_r]) + np.matmul(J, u_q[r:, :new_r])
+		self.s = s_q[:new_r]
+		if self.store_v:
+			self.v = np.vstack([np.matmul(self.v, v_q.T[:r, :new_r]), v_q.T[r:, :new_r]])
+
+		self.num_updates += 1
+		if self.reorthogonalize and self.num_updates % self.reorthogonalize == 0:
+			self.u, R = np.linalg.qr(self.u)
+			u_r, self.s, v_r = np.linalg.svd(R * self.s)
+			self.u = np.matmul(self.u, u_r)
+			if self.store_v:
+				self.v = np.matmul(self.v, v_r.T)
+
+		return self
+
+	# Function to return the rank k approximation of columns C in the current basis (U U^T C)
+	def project(self, C):
+		C = np.asarray(C, dtype=np.float64)
+		return np.matmul(self.u, np.matmul(self.u.T, C))
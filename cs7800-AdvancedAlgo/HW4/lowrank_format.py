@@ -0,0 +1,188 @@
+#
+#   Compact on-disk container for low-rank (truncated SVD) image approximations
+#   Instead of rebuilding a dense image and saving it as PNG, the factors U_k, s_k and V_k are stored
+#   directly, either as float16 or as int8 with one float32 scale per singular vector.
+#
+#   File layout (little-endian)...
+#       header:  magic 'LRIM', version (u8), dtype code (u8), layout code (u8), channels (u16), 
+#                m, n, k (u32 each)
+#       for every factor block:
+#           s_k                     k x float32
+#           U scales, V scales      k x float32 each (int8 only)
+#           U_k^T                   k x m (one singular vector per row)
+#           V_k                     k x width
+#   Both factors are stored one singular vector per row, so decoding at a lower rank r only has to
+#   read the first r rows of each block.
+#   With the 'per_channel' layout there is one block per channel (width = n). With the 'stacked' layout
+#   there is a single block factorizing the channels side by side (m x channels*n, width = channels*n),
+#   so the channels share U_k and each has its own n columns of V_k.
+#   Version 1 files (no layout code, always per channel) can still be read.
+#
+#   Usage: python lowrank_format.py encode input_image output.lrim k [float16|int8]
+#          python lowrank_format.py decode input.lrim output_image [rank]
+#
+
+import sys
+import struct
+import numpy as np
+
+magic = b'LRIM'
+version = 2
+header_format = '<4sBBBHIII'
+header_size = struct.calcsize(header_format)
+header_format_v1 = '<4sBBHIII'
+header_size_v1 = struct.calcsize(header_format_v1)
+
+dtype_codes = {'float16': 0, 'int8': 1}
+dtype_names = {code: name for name, code in dtype_codes.items()}
+
+layout_codes = {'per_channel': 0, 'stacked': 1}
+layout_names = {code: name for name, code in layout_codes.items()}
+
+
+# Function to quantize each row of a matrix to int8, returning (int8 rows, float32 scale per row)
+def quantize_rows(A):
+	scale = np.max(np.absolute(A), axis=1) / 127.0
+	scale[scale == 0] = 1.0
+	q = np.rint(A / scale[:, None]).astype(np.int8)
+	return q, scale.astype(np.float32)
+
+
+# Function to return the byte size of one channel's block for the given dimensions
+def channel_size(m, n, k, dtype):
+	if dtype == 'float16':
+		return 4*k + 2*k*(m + n)
+	return 4*k + 8*k + k*(m + n)
+
+
+# Function to encode the factors into the container format
+# factors is a list of (u, s, v) tuples as returned by truncated_svd, one per channel, or with the
+# 'stacked' layout a single tuple factorizing the given number of channels side by side (m x channels*n)
+def encode(factors, dtype='int8', layout='per_channel', channels=None):
+	if dtype not in dtype_codes:
+		raise ValueError("Unknown factor dtype '%s', expected one of: %s" % (dtype, ', '.join(dtype_codes)))
+	if layout not in layout_codes:
+		raise ValueError("Unknown layout '%s', expected one of: %s" % (layout, ', '.join(layout_codes)))
+
+	m, k = factors[0][0].shape
+	width = factors[0][2].shape[1]
+	if layout == 'stacked':
+		if len(factors) != 1 or not channels or width % channels != 0:
+			raise ValueError("The stacked layout needs one factorization of an m x (channels*n) matrix")
+		n = width // channels
+	else:
+		channels = len(factors)
+		n = width
+	parts = [struct.pack(header_format, magic, version, dtype_codes[dtype], layout_codes[layout], channels, m, n, k)]
+
+	for u, s, v in factors:
+		parts.append(np.asarray(s, dtype='<f4').tobytes())
+		if dtype == 'float16':
+			parts.append(np.asarray(u.T, dtype='<f2').tobytes())
+			parts.append(np.asarray(v, dtype='<f2').tobytes())
+		else:
+			q_u, scale_u = quantize_rows(u.T)
+			q_v, scale_v = quantize_rows(v)
+			parts += [scale_u.astype('<f4').tobytes(), scale_v.astype('<f4').tobytes(), q_u.tobytes(), q_v.tobytes()]
+
+	return b''.join(parts)
+
+
+# Function to read the header of an encoded buffer
+# Returns (dtype, layout, channels, m, n, k, size of the header in bytes)
+def read_header(buf):
+	file_magic, file_version = struct.unpack_from('<4sB', buf, 0)
+	if file_magic != magic:
+		raise ValueError("Not a low-rank image file (bad magic %r)" % file_magic)
+	if file_version == 1:
+		_, _, dtype_code, channels, m, n, k = struct.unpack_from(header_format_v1, buf, 0)
+		return dtype_names[dtype_code], 'per_channel', channels, m, n, k, header_size_v1
+	if file_version != version:
+		raise ValueError("Unsupported low-rank image file version %d" % file_version)
+	_, _, dtype_code, layout_code, channels, m, n, k = struct.unpack_from(header_format, buf, 0)
+	return dtype_names[dtype_code], layout_names[layout_code], channels, m, n, k, header_size
+
+
+# Function to decode the factors of every block, using only the first r singular triplets
+# (r defaults to the full stored rank). Returns a list of float32 (u, s, v) tuples, one per channel,
+# or a single one of the side by side channels with the 'stacked' layout
+def decode_factors(buf, r=None):
+	dtype, layout, channels, m, n, k, offset = read_header(buf)
+	r = k if r is None else min(r, k)
+	if layout == 'stacked':
+		num_blocks, n = 1, channels*n
+	else:
+		num_blocks = channels
+
+	factors = []
+	for c in range(num_blocks):
+		s = np.frombuffer(buf, dtype='<f4', count=r, offset=offset)
+		pos = offset + 4*k
+
+		if dtype == 'float16':
+			u = np.frombuffer(buf, dtype='<f2', count=r*m, offset=pos).reshape(r, m)
+			v = np.frombuffer(buf, dtype='<f2', count=r*n, offset=pos + 2*k*m).reshape(r, n)
+			u = u.astype(np.float32)
+			v = v.astype(np.float32)
+		else:
+			scale_u = np.frombuffer(buf, dtype='<f4', count=r, offset=pos)
+			scale_v = np.frombuffer(buf, dtype='<f4', count=r, offset=pos + 4*k)
+			pos += 8*k
+			q_u = np.frombuffer(buf, dtype=np.int8, count=r*m, offset=pos).reshape(r, m)
+			q_v = np.frombuffer(buf, dtype=np.int8, count=r*n, offset=pos + k*m).reshape(r, n)
+
+			# Fold the per-vector scales into the singular values, so only one multiply is needed
+			u = q_u.astype(np.float32)
+			v = q_v.astype(np.float32)
+			s = s * scale_u * scale_v
+
+		factors.append((u.T, np.asarray(s, dtype=np.float32), v))
+		offset += channel_size(m, n, k, dtype)
+
+	return factors
+
+
+# Function to decode an encoded buffer into an 8-bit image at rank r (grayscale, or m x n x channels)
+def decode(buf, r=None):
+	_, layout, num_channels, m, n, _, _ = read_header(buf)
+
+	channels = []
+	for u, s, v in decode_factors(buf, r):
+		A = np.matmul(u * s, v)
+		channels.append(np.clip(np.rint(A), 0, 255).astype(np.uint8))
+
+	if layout == 'stacked':
+		return np.squeeze(channels[0].reshape(m, num_channels, n).transpose(0, 2, 1))
+	if len(channels) == 1:
+		return channels[0]
+	return np.dstack(channels)
+
+
+# Function to write the factors to a file (see encode)
+def save(filename, factors, dtype='int8', layout='per_channel', channels=None):
+	with open(filename, 'wb') as output_file:
+		output_file.write(encode(factors, dtype, layout, channels))
+
+
+# Function to read a file and decode it into an 8-bit image at rank r
+# The file is memory-mapped, so a lower rank decode only reads the parts of the file it needs
+def load(filename, r=None):
+	return decode(np.memmap(filename, dtype=np.uint8, mode='r'), r)
+
+
+if __name__ == '__main__':
+	import cv2
+	from truncated_svd import truncated_svd
+
+	if len(sys.argv) >= 5 and sys.argv[1] == 'encode':
+		image = cv2.imread(sys.argv[2], cv2.IMREAD_GRAYSCALE)
+		k = int(sys.argv[4])
+		dtype = sys.argv[5] if len(sys.argv) > 5 else 'int8'
+		save(sys.argv[3], [truncated_svd(image, k)], dtype)
+	elif len(sys.argv) >= 4 and sys.argv[1] == 'decode':
+		r = int(sys.argv[4]) if len(sys.argv) > 4 else None
+		cv2.imwrite(sys.argv[3], load(sys.argv[2], r))
+	else:
+		print("\nNot a valid argument, please use an argument in one of the following formats...")
+		print("python lowrank_format.py encode input_image output.lrim k [float16|int8]")
+		print("python lowrank_format.py decode input.lrim output_image [rank]\n")
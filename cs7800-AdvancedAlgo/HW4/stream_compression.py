@@ -0,0 +1,120 @@
+#
+#   Streaming low-rank compression of a sequence of frames (video, or a directory of near-duplicate
+#   images), using the incremental SVD in incremental_svd.py
+#   Every frame is one column of a (pixels x frames) matrix. A rank k basis is kept up to date as each
+#   block of new frames arrives, and each frame is compressed by projecting it onto the current basis.
+#   For comparison, the same is done by recomputing a rank k SVD of every frame seen so far for each
+#   new block, which is what calling svd_compression.py on the sequence amounts to. Throughput in
+#   frames per second and the error drift of the incremental basis against the optimal rank k
+#   approximation of the frames seen so far are reported, every report_every blocks and after the last
+#   block. The incremental basis only ever keeps k directions, so whatever it drops from earlier frames
+#   is lost for good, and its error drifts above the optimum by an amount that depends on the sequence
+#   (there is no bound on it); the drift printed is measured, not estimated.
+#
+#   Usage: python stream_compression.py [source] [k] [block_size] [num_frames]
+#       source: a video file or a directory of images. Without one, a synthetic panning sequence is
+#               made from prudential.jpg
+#
+
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+from incremental_svd import IncrementalSVD
+from truncated_svd import truncated_svd
+
+# Number of blocks between error drift reports
+report_every = 10
+
+
+# Function to yield grayscale frames from a video file or a directory of images
+def read_frames(source, num_frames):
+	if source is None:
+		# Synthetic sequence: a window panning across the photograph, with a slight brightness flicker
+		image = cv2.cvtColor(cv2.imread('prudential.jpg'), cv2.COLOR_BGR2GRAY)
+		image = cv2.resize(image, None, fx=0.5, fy=0.5)
+		rng = np.random.RandomState(0)
+		for t in range(num_frames):
+			frame = image[t % 96:t % 96 + 384, (2*t) % 96:(2*t) % 96 + 288].astype(np.float64)
+			yield np.clip(frame * (1 + 0.02*rng.randn()), 0, 255)
+	elif os.path.isdir(source):
+		names = sorted(f for f in os.listdir(source) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')))
+		for name in names[:num_frames]:
+			yield cv2.imread(os.path.join(source, name), cv2.IMREAD_GRAYSCALE).astype(np.float64)
+	else:
+		capture = cv2.VideoCapture(source)
+		for t in range(num_frames):
+			ok, frame = capture.read()
+			if not ok:
+				break
+			yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).astype(np.float64)
+		capture.release()
+
+
+# Function to group frames into (pixels x block_size) blocks, one frame per column
+# The last block holds whatever frames are left, so no frame is dropped when the number of frames isn't
+# a multiple of block_size
+def read_blocks(frames, block_size):
+	block = []
+	for frame in frames:
+		block.append(frame.ravel())
+		if len(block) == block_size:
+			yield np.array(block).T
+			block = []
+	if block:
+		yield np.array(block).T
+
+
+# Function to return the relative Frobenius error of projecting columns X onto the basis u
+def projection_error(u, X):
+	return np.linalg.norm(X - np.matmul(u, np.matmul(u.T, X))) / np.linalg.norm(X)
+
+
+if __name__ == '__main__':
+	source = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].isdigit() else None
+	args = [int(a) for a in sys.argv[1:] if a.isdigit()]
+	k = args[0] if len(args) > 0 else 20
+	block_size = args[1] if len(args) > 1 else 1
+	num_frames = args[2] if len(args) > 2 else 100
+
+	model = IncrementalSVD(k)
+	frames = []
+	incremental_time = 0.0
+	recompute_time = 0.0
+	num_blocks = 0
+
+	print('\n{0:>7} {1:>16} {2:>15} {3:>16} {4:>15} {5:>10}'.format('Frames', 'Incremental fps', 'Recompute fps', 'Incremental err', 'Optimal err', 'Drift'))
+	blocks = read_blocks(read_frames(source, num_frames), block_size)
+	C = next(blocks, None)
+	while C is not None:
+		frames.append(C)
+		num_blocks += 1
+		next_block = next(blocks, None)
+
+		# Incremental: update the basis with the new frames, then compress them
+		start = time.perf_counter()
+		model.update(C)
+		compressed = model.project(C)
+		incremental_time += time.perf_counter() - start
+
+		# Recompute: rank k (randomized) SVD of every frame so far, then compress the new frames
+		start = time.perf_counter()
+		X = np.hstack(frames)
+		u, s, v = truncated_svd(X, k)
+		compressed = np.matmul(u, np.matmul(u.T, C))
+		recompute_time += time.perf_counter() - start
+
+		# Report every report_every blocks, and always after the last one
+		if num_blocks % report_every == 0 or next_block is None:
+			# The optimal rank k error of the frames so far, from their exact singular values
+			s = np.linalg.svd(X, compute_uv=False)
+			num_seen = X.shape[1]
+			incremental_err = projection_error(model.u, X)
+			optimal_err = np.sqrt(np.sum(s[k:]**2)) / np.linalg.norm(X)
+			drift = '%9.2f%%' % (100*(incremental_err - optimal_err) / optimal_err) if optimal_err > 1e-9 else '-'
+			print('{0:>7} {1:>16.1f} {2:>15.1f} {3:>16.6f} {4:>15.6f} {5:>10}'.format(num_seen, num_seen / incremental_time, num_seen / recompute_time,
+				incremental_err, optimal_err, drift))
+		C = next_block
+	print('')
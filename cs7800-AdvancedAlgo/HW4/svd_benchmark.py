@@ -0,0 +1,48 @@
+#
+#   Benchmark for the truncated SVD engine in truncated_svd.py
+#   The grayscale photograph is upscaled to simulate larger images, and the rank k approximation is
+#   computed with the exact SVD (np.linalg.svd, as svd_compression.py originally did), randomized
+#   range finding and ARPACK. For each method, the time taken, the speedup over the exact SVD, the
+#   relative Frobenius error of the reconstruction and how much larger that error is than the
+#   optimal (exact rank k) error are reported.
+#
+#   Usage: python svd_benchmark.py [k] [max_scale]
+#
+
+import sys
+import time
+import cv2
+import numpy as np
+
+from truncated_svd import truncated_svd
+
+
+# Function to time a rank k SVD and return (seconds, relative Frobenius error of the reconstruction)
+def time_method(A, k, method):
+	start = time.perf_counter()
+	u_k, s_k, v_k = truncated_svd(A, k, method=method)
+	seconds = time.perf_counter() - start
+
+	err = np.linalg.norm(A - np.dot(u_k * s_k, v_k)) / np.linalg.norm(A)
+	return seconds, err
+
+
+if __name__ == '__main__':
+	k = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+	max_scale = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+	grayImage = cv2.cvtColor(cv2.imread('prudential.jpg'), cv2.COLOR_BGR2GRAY)
+
+	print('\n{0:>12} {1:>11} {2:>10} {3:>9} {4:>12} {5:>14}'.format('Size', 'Method', 'Time (s)', 'Speedup', 'Rel. error', 'Excess error'))
+	scale = 1
+	while scale <= max_scale:
+		A = cv2.resize(grayImage, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC).astype(np.float64)
+		size = '%dx%d' % A.shape
+
+		exact_time, exact_err = time_method(A, k, 'exact')
+		print('{0:>12} {1:>11} {2:>10.3f} {3:>8.1f}x {4:>12.6f} {5:>14}'.format(size, 'exact', exact_time, 1.0, exact_err, '-'))
+		for method in ['randomized', 'arpack']:
+			seconds, err = time_method(A, k, method)
+			print('{0:>12} {1:>11} {2:>10.3f} {3:>8.1f}x {4:>12.6f} {5:>13.4f}%'.format(size, method, seconds, exact_time / seconds, err, 100*(err - exact_err) / exact_err))
+
+		scale *= 2
@@ -1,48 +1,205 @@
+#
+#   Low-rank (truncated SVD) compression of a grayscale image
+#   Usage: python svd_compression.py [method]
+#          python svd_compression.py sweep [method] [rank ...]
+#          python svd_compression.py target error=<relative error> | psnr=<dB> | bytes=<budget>
+#   where method is randomized (default), arpack or exact (see truncated_svd.py).
+#   The sweep mode factorizes the image once and writes the approximation for every requested rank
+#   (10, 50, 75 and 100 by default) from prefixes of the same factors, along with a table of the
+#   Frobenius error, PSNR and compressed size of each rank.
+#   The target mode picks the smallest rank that meets a relative Frobenius error or PSNR target, or
+#   the largest rank that fits in a byte budget, computing singular triplets only until it is met.
+#
+
+import sys
+import time
 import cv2
 import numpy as np
 
+from truncated_svd import truncated_svd, randomized_svd_to_tolerance
+
 k = 100
 
-image = cv2.imread('prudential.jpg')
+# Ranks written by the sweep mode when none are given
+sweep_ranks = [10, 50, 75, 100]
+
+# Bytes per stored factor entry when counting the compressed size (float32 factors)
+factor_itemsize = 4
+
+
+# Function to compute the rank k approximation of an image matrix
+# Only the top k singular triplets are computed (see truncated_svd.py for the available methods)
+def compress(grayImage, k, method='randomized'):
+	u_k, s_k, v_k = truncated_svd(grayImage, k, method=method)
+	return np.dot(u_k[:, :k] * s_k, v_k), s_k
+
+
+# Function to return the rank of a matrix from its (descending) singular values, using the same
+# tolerance as np.linalg.matrix_rank, so no extra decomposition is needed
+# If only the leading singular values are known and all of them are above the tolerance, the rank
+# is only known to be at least len(s), which is flagged by returning exact = False
+def rank_from_singular_values(s, shape, complete=True):
+	tol = s[0] * max(shape) * np.finfo(np.float64).eps
+	rank = int(np.sum(s > tol))
+	return rank, complete or rank < len(s)
+
+
+# Function to rebuild the rank r approximation from the first r singular triplets
+def reconstruct(u, s, v, r):
+	return np.dot(u[:, :r] * s[:r], v[:r, :])
+
+
+# Function to convert an approximation back into a displayable 8-bit image
+# (values are rounded and clipped, since a low-rank approximation can stray outside [0, 255])
+def to_image(A):
+	return np.clip(np.rint(A), 0, 255).astype(np.uint8)
+
+
+# Function to return the PSNR (in dB) of an 8-bit image against the original
+def psnr(original, image):
+	mse = np.mean((original.astype(np.float64) - image.astype(np.float64))**2)
+	if mse == 0:
+		return np.inf
+	return 10 * np.log10(255.0**2 / mse)
+
+
+# Function to return the number of bytes needed to store the rank r factors of an m x n image
+def compressed_bytes(shape, r, itemsize=factor_itemsize):
+	return r * (shape[0] + shape[1] + 1) * itemsize
+
+
+# Function to factorize the image once and write the approximation for every rank in ranks
+# Returns one (rank, Frobenius error, relative error, PSNR, bytes) row per rank
+def sweep(grayImage, ranks, method='randomized'):
+	A = grayImage.astype(np.float64)
+	max_rank = max(ranks)
+
+	# The exact method gives every singular value for free, which pins down the original rank
+	if method == 'exact':
+		u, s, v = np.linalg.svd(A, full_matrices=False)
+	else:
+		u, s, v = truncated_svd(A, max_rank, method=method)
+
+	rank, exact = rank_from_singular_values(s, A.shape, complete=(method == 'exact'))
+	if exact:
+		print("\nThe rank of the original image matrix is: %d\n" % rank)
+	else:
+		print("\nThe rank of the original image matrix is at least: %d\n" % rank)
+
+	norm = np.linalg.norm(A)
+	rows = []
+	for r in ranks:
+		newImage = reconstruct(u, s, v, r)
+		err = np.linalg.norm(A - newImage)
+
+		newImage = to_image(newImage)
+		cv2.imwrite('rank_' + str(r) + '_approx_image.png', newImage)
+
+		rows.append((r, err, err / norm, psnr(grayImage, newImage), compressed_bytes(A.shape, r)))
+
+	return rows
+
+
+# Function to compress an image to the smallest rank that meets a target, given as one of...
+#   'error': relative Frobenius error ||A - A_r|| / ||A||
+#   'psnr':  PSNR in dB (of the unrounded approximation)
+#   'bytes': size of the float32 factors, in which case the largest rank that fits is used
+# Returns the approximation and its factors
+def compress_to_target(grayImage, kind, value):
+	A = grayImage.astype(np.float64)
+	m, n = A.shape
+
+	if kind == 'bytes':
+		r = int(value) // compressed_bytes(A.shape, 1)
+		if r < 1:
+			raise ValueError("A budget of %d bytes can't hold even a rank 1 approximation (%d bytes)" % (value, compressed_bytes(A.shape, 1)))
+		u, s, v = truncated_svd(A, min(r, m, n))
+	else:
+		if kind == 'error':
+			max_err_sq = (value * np.linalg.norm(A))**2
+		elif kind == 'psnr':
+			max_err_sq = m * n * 255.0**2 / 10**(value / 10.0)
+		else:
+			raise ValueError("Unknown target '%s', expected error, psnr or bytes" % kind)
+		u, s, v = randomized_svd_to_tolerance(A, max_err_sq)
+
+	return reconstruct(u, s, v, s.shape[0]), (u, s, v)
+
+
+if __name__ == '__main__':
+	args = sys.argv[1:]
+	sweep_mode = len(args) > 0 and args[0] == 'sweep'
+	target_mode = len(args) > 0 and args[0] == 'target'
+	if sweep_mode or target_mode:
+		args = args[1:]
+
+	# The target mode needs exactly one error=, psnr= or bytes= argument
+	if target_mode and (len(args) != 1 or args[0].split('=')[0] not in ['error', 'psnr', 'bytes'] or len(args[0].split('=')) != 2):
+		print("\nNot a valid argument, please use an argument in the following format...")
+		print("python svd_compression.py target error=<relative error> | psnr=<dB> | bytes=<budget>\n")
+		sys.exit(1)
+
+	# Optionally choose the SVD method (randomized, arpack or exact), and the ranks to sweep
+	methods = [a for a in args if not a.isdigit() and '=' not in a]
+	method = methods[0] if methods else 'randomized'
+	ranks = [int(a) for a in args if a.isdigit()] or sweep_ranks
+
+	image = cv2.imread('prudential.jpg')
 
-grayImage = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-cv2.imwrite('original_image.png', grayImage)
+	grayImage = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+	cv2.imwrite('original_image.png', grayImage)
 
-print("\nThe rank of the original image matrix is: %d\n" % np.linalg.matrix_rank(grayImage))
+	# print(grayImage)
+	# print(grayImage.shape)
+	# cv2.imshow('Original image',image[200:1024,:])
+	# cv2.imshow('Gray image', grayImage[200:1024,:])
+	# cv2.waitKey(0)
+	# cv2.destroyAllWindows()
 
-# print(grayImage)
-# print(grayImage.shape)
-# cv2.imshow('Original image',image[200:1024,:])
-# cv2.imshow('Gray image', grayImage[200:1024,:])
-# cv2.waitKey(0)
-# cv2.destroyAllWindows()
+	if sweep_mode:
+		rows = sweep(grayImage, ranks, method)
 
-u, s, v = np.linalg.svd(grayImage)
+		print('{0:>6} {1:>14} {2:>11} {3:>11} {4:>12} {5:>7}'.format('Rank', 'Frobenius err', 'Rel. err', 'PSNR (dB)', 'Bytes', 'Ratio'))
+		for r, err, rel_err, p, num_bytes in rows:
+			print('{0:>6} {1:>14.2f} {2:>11.6f} {3:>11.2f} {4:>12} {5:>6.2f}x'.format(r, err, rel_err, p, num_bytes, grayImage.size / num_bytes))
+		print('')
+	elif target_mode:
+		kind, value = args[0].split('=')
 
-# print(u.shape)
-# print(s.shape)
-# print(v.shape)
-# print(s)
-# print(np.allclose(grayImage, np.dot(u[:, :768] * s, v)))
+		start = time.perf_counter()
+		newImage, (u, s, v) = compress_to_target(grayImage, kind, float(value))
+		seconds = time.perf_counter() - start
 
-u_k = u[:,0:k]
-s_k = s[0:k]
-v_k = v[0:k,:]
+		# Time the fixed rank k run for comparison
+		start = time.perf_counter()
+		compress(grayImage, k, 'randomized')
+		fixed_seconds = time.perf_counter() - start
 
-# print(u.shape)
-# print(s.shape)
-# print(v.shape)
+		err = np.linalg.norm(grayImage - newImage) / np.linalg.norm(grayImage.astype(np.float64))
+		r = s.shape[0]
+		newImage = to_image(newImage)
+		cv2.imwrite('rank_' + str(r) + '_approx_image.png', newImage)
 
-newImage = np.dot(u_k[:, :k] * s_k, v_k)
+		print("\nTarget %s = %s met with rank %d" % (kind, value, r))
+		print("Relative Frobenius error: %.6f, PSNR: %.2f dB, factor bytes: %d" % (err, psnr(grayImage, newImage), compressed_bytes(grayImage.shape, r)))
+		print("Time: %.3f s (fixed rank %d: %.3f s)\n" % (seconds, k, fixed_seconds))
+	else:
+		newImage, s_k = compress(grayImage, k, method)
 
-print("The rank of the new approximated image matrix is: %d\n" % np.linalg.matrix_rank(newImage))
+		# If fewer than k singular values are non-zero, the original rank is known exactly
+		rank, exact = rank_from_singular_values(s_k, grayImage.shape, complete=False)
+		if exact:
+			print("\nThe rank of the original image matrix is: %d\n" % rank)
+		else:
+			print("\nThe rank of the original image matrix is at least: %d\n" % rank)
+		print("The rank of the new approximated image matrix is: %d\n" % rank)
 
-newImage = np.array(newImage ,dtype=np.uint8)
+		newImage = to_image(newImage)
 
-new_filename = 'rank_' + str(k) + '_approx_image.png'
-cv2.imwrite(new_filename, newImage)
+		new_filename = 'rank_' + str(k) + '_approx_image.png'
+		cv2.imwrite(new_filename, newImage)
 
-# print(newImage)
-# cv2.imshow('New Image', newImage)
-# cv2.waitKey(0)
-# cv2.destroyAllWindows()
\ No newline at end of file
+		# print(newImage)
+		# cv2.imshow('New Image', newImage)
+		# cv2.waitKey(0)
+		# cv2.destroyAllWindows()
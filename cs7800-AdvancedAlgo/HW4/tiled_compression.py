@@ -0,0 +1,136 @@
+#
+#   Tiled low-rank compression for images too large to decompose as one dense matrix
+#   The grayscale image is memory-mapped and split into square tiles. Every tile is compressed
+#   independently by a process pool, with either a fixed rank per tile or the smallest rank that keeps
+#   a given fraction of the tile's energy (sum of squared singular values). Workers write their
+#   approximations straight into a memory-mapped output, so the peak memory of each worker depends
+#   on the tile size rather than the image size.
+#
+#   Usage: python tiled_compression.py input output [tile_size] [rank | energy] [num_workers]
+#       input:   a 2D uint8 .npy file (memory-mapped directly), or any image cv2 can read, which is
+#                converted once into a .npy cache next to it
+#       output:  a .npy file (written as a memmap), or an image file
+#       rank | energy:  a value >= 1 is a fixed rank per tile, a value < 1 is an energy threshold
+#
+
+import os
+import sys
+import time
+import resource
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from truncated_svd import truncated_svd
+from svd_compression import to_image
+
+
+# Memory-mapped input and output, opened once in each worker process (see open_images)
+worker_input = None
+worker_output = None
+
+
+# Function to return a memory-mapped grayscale version of the input image
+def map_input(filename):
+	if filename.endswith('.npy'):
+		return np.load(filename, mmap_mode='r')
+
+	# cv2 can only decode the whole image at once, so this happens a single time and the decoded
+	# pixels are cached as a .npy file that later runs (and the workers) memory-map instead
+	cache = os.path.splitext(filename)[0] + '_gray.npy'
+	if not os.path.exists(cache) or os.path.getmtime(cache) < os.path.getmtime(filename):
+		import cv2
+		np.save(cache, cv2.imread(filename, cv2.IMREAD_GRAYSCALE))
+	return np.load(cache, mmap_mode='r')
+
+
+# Function run once in every worker process to memory-map the input and output images
+def open_images(input_name, output_name):
+	global worker_input, worker_output
+	worker_input = np.load(input_name, mmap_mode='r')
+	worker_output = np.load(output_name, mmap_mode='r+')
+
+
+# Function to return the smallest rank that keeps the given fraction of the energy in s
+def energy_rank(s, energy):
+	cumulative = np.cumsum(s**2)
+	return int(np.searchsorted(cumulative, energy * cumulative[-1]) + 1)
+
+
+# Function run in a worker to compress one tile and write it to the output
+# Returns (rank used, tile shape, squared Frobenius error, squared Frobenius norm of the tile)
+def compress_tile(task):
+	row, col, tile_size, target = task
+	tile = np.asarray(worker_input[row:row + tile_size, col:col + tile_size], dtype=np.float64)
+	max_rank = min(tile.shape)
+
+	if target >= 1:
+		r = min(int(target), max_rank)
+		if r < max_rank:
+			u, s, v = truncated_svd(tile, r)
+		else:
+			u, s, v = np.linalg.svd(tile, full_matrices=False)
+	else:
+		# The tile is small, so its full spectrum is cheap and gives the energy threshold exactly
+		u, s, v = np.linalg.svd(tile, full_matrices=False)
+		r = energy_rank(s, target)
+
+	approx = np.dot(u[:, :r] * s[:r], v[:r, :])
+	worker_output[row:row + tile_size, col:col + tile_size] = to_image(approx)
+
+	return r, tile.shape, float(np.sum((tile - approx)**2)), float(np.sum(tile**2))
+
+
+# Function to compress an image tile by tile, writing the result to output_name (.npy)
+# Returns the list of compress_tile results, one per tile
+def compress_tiled(input_name, output_name, tile_size=512, target=50, num_workers=None):
+	image = map_input(input_name)
+	if image.ndim != 2:
+		raise ValueError("Tiled compression expects a grayscale (2D) image, got shape %s" % (image.shape,))
+	if not input_name.endswith('.npy'):
+		input_name = os.path.splitext(input_name)[0] + '_gray.npy'
+
+	output = np.lib.format.open_memmap(output_name, mode='w+', dtype=np.uint8, shape=image.shape)
+	del output
+
+	tasks = [(row, col, tile_size, target) for row in range(0, image.shape[0], tile_size) for col in range(0, image.shape[1], tile_size)]
+	with ProcessPoolExecutor(max_workers=num_workers, initializer=open_images, initargs=(input_name, output_name)) as pool:
+		return list(pool.map(compress_tile, tasks, chunksize=4))
+
+
+if __name__ == '__main__':
+	if len(sys.argv) < 3:
+		print("\nNot a valid argument, please use an argument in the following format...")
+		print("python tiled_compression.py input output [tile_size] [rank | energy] [num_workers]\n")
+		sys.exit(1)
+
+	input_name = sys.argv[1]
+	output_name = sys.argv[2]
+	tile_size = int(sys.argv[3]) if len(sys.argv) > 3 else 512
+	target = float(sys.argv[4]) if len(sys.argv) > 4 else 50
+	num_workers = int(sys.argv[5]) if len(sys.argv) > 5 else None
+
+	# Images other than .npy are written through a temporary .npy memmap
+	npy_name = output_name if output_name.endswith('.npy') else os.path.splitext(output_name)[0] + '_tiled.npy'
+
+	start = time.perf_counter()
+	results = compress_tiled(input_name, npy_name, tile_size, target, num_workers)
+	seconds = time.perf_counter() - start
+
+	if npy_name != output_name:
+		import cv2
+		cv2.imwrite(output_name, np.load(npy_name, mmap_mode='r'))
+		os.remove(npy_name)
+
+	ranks = np.array([r for r, _, _, _ in results])
+	err = np.sqrt(sum(e for _, _, e, _ in results))
+	norm = np.sqrt(sum(n for _, _, _, n in results))
+	factor_bytes = sum(r * (shape[0] + shape[1] + 1) * 4 for r, shape, _, _ in results)
+	num_pixels = sum(shape[0] * shape[1] for _, shape, _, _ in results)
+
+	print("\nCompressed %d pixels as %d tiles of up to %dx%d in %.3f s" % (num_pixels, len(results), tile_size, tile_size, seconds))
+	print("Tile ranks: min %d, mean %.1f, max %d" % (ranks.min(), ranks.mean(), ranks.max()))
+	print("Relative Frobenius error: %.6f" % (err / norm))
+	print("Factor storage (float32): %d bytes (%.2fx smaller than the raw image)" % (factor_bytes, num_pixels / factor_bytes))
+
+	# Linux reports ru_maxrss in KB, this is the largest peak memory of any single worker
+	print("Peak worker memory: %.1f MB\n" % (resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0))
@@ -0,0 +1,110 @@
+#
+#   Truncated SVD engine for svd_compression.py
+#   Computes only the top k singular triplets (U_k, s_k, V_k) of an m x n matrix, in O(mnk) work,
+#   instead of the full decomposition that np.linalg.svd computes and svd_compression.py then
+#   throws away past k. Two methods are available...
+#       - 'randomized': randomized range finding with power iterations (Halko, Martinsson & Tropp)
+#       - 'arpack':     ARPACK's implicitly restarted Lanczos method, through scipy.sparse.linalg.svds
+#   Both return the factors in the same layout as np.linalg.svd (s in descending order, V_k as k x n).
+#
+
+import numpy as np
+
+
+# Function to compute a rank k approximate SVD by randomized range finding
+# The range of A is sampled with k + oversamples random vectors, sharpened with power_iters rounds
+# of multiplying by A A^T (re-orthonormalizing in between for numerical stability), and the SVD of
+# the small projected matrix Q^T A gives the factors
+def randomized_svd(A, k, oversamples=10, power_iters=4, seed=0):
+	m, n = A.shape
+	l = min(k + oversamples, m, n)
+	rng = np.random.RandomState(seed)
+
+	Q = np.matmul(A, rng.standard_normal((n, l)).astype(A.dtype))
+	Q, _ = np.linalg.qr(Q)
+	for i in range(power_iters):
+		Z, _ = np.linalg.qr(np.matmul(A.T, Q))
+		Q, _ = np.linalg.qr(np.matmul(A, Z))
+
+	B = np.matmul(Q.T, A)
+	u_b, s, v = np.linalg.svd(B, full_matrices=False)
+	u = np.matmul(Q, u_b[:, :k])
+
+	return u, s[:k], v[:k, :]
+
+
+# Function to compute a rank k SVD with ARPACK (Lanczos bidiagonalization)
+def arpack_svd(A, k, seed=0):
+	from scipy.sparse.linalg import svds
+
+	m, n = A.shape
+	if k >= min(m, n):
+		raise ValueError("ARPACK needs k < min(m, n), got k = %d for a %d x %d matrix" % (k, m, n))
+
+	v0 = np.random.RandomState(seed).uniform(-1, 1, min(m, n))
+	u, s, v = svds(A, k=k, v0=v0)
+
+	# svds returns the singular values in ascending order
+	order = np.argsort(s)[::-1]
+	return u[:, order], s[order], v[order, :]
+
+
+# Function to compute the top k singular triplets of A with the chosen method ('exact' runs the
+# full np.linalg.svd and truncates it, for reference)
+def truncated_svd(A, k, method='randomized', **kwargs):
+	A = np.asarray(A)
+	if not np.issubdtype(A.dtype, np.floating):
+		A = A.astype(np.float64)
+
+	if method == 'randomized':
+		return randomized_svd(A, k, **kwargs)
+	elif method == 'arpack':
+		return arpack_svd(A, k, **kwargs)
+	elif method == 'exact':
+		u, s, v = np.linalg.svd(A, full_matrices=False)
+		return u[:, :k], s[:k], v[:k, :]
+	raise ValueError("Unknown SVD method '%s', expected one of: randomized, arpack, exact" % method)
+
+
+# Function to compute the smallest rank approximation of A whose squared Frobenius error is at most
+# max_err_sq, without computing more singular triplets than needed
+# The range of A is built up block_size vectors at a time (blocked randomized QB factorization).
+# Since Q stays orthonormal and B = Q^T A, the error of A ~ QB is known for free as
+# ||A||^2 - ||B||^2, so blocks stop being added as soon as the target is reachable. The smallest
+# rank r that meets the target is then picked from the singular values of B. Returns (u, s, v) with
+# exactly r triplets, or max_rank triplets if the target can't be met within max_rank
+def randomized_svd_to_tolerance(A, max_err_sq, block_size=16, power_iters=2, max_rank=None, seed=0):
+	m, n = A.shape
+	max_rank = min(m, n) if max_rank is None else min(max_rank, m, n)
+	rng = np.random.RandomState(seed)
+
+	norm_sq = float(np.sum(np.square(A, dtype=np.float64)))
+	Q = np.zeros((m, 0), dtype=A.dtype)
+	B = np.zeros((0, n), dtype=A.dtype)
+	B_norm_sq = 0.0
+
+	while Q.shape[1] < max_rank and norm_sq - B_norm_sq > max_err_sq:
+		b = min(block_size, max_rank - Q.shape[1])
+		Y = np.matmul(A, rng.standard_normal((n, b)).astype(A.dtype))
+		for i in range(power_iters):
+			Y, _ = np.linalg.qr(Y - np.matmul(Q, np.matmul(Q.T, Y)))
+			Y = np.matmul(A, np.matmul(A.T, Y))
+
+		# Orthogonalize the new block against the previous ones (twice, for numerical stability)
+		Y = Y - np.matmul(Q, np.matmul(Q.T, Y))
+		Y = Y - np.matmul(Q, np.matmul(Q.T, Y))
+		Q_b, _ = np.linalg.qr(Y)
+		B_b = np.matmul(Q_b.T, A)
+
+		Q = np.hstack([Q, Q_b])
+		B = np.vstack([B, B_b])
+		B_norm_sq += float(np.sum(np.square(B_b, dtype=np.float64)))
+
+	u_b, s, v = np.linalg.svd(B, full_matrices=False)
+
+	# Squared error of the rank r truncation is ||A||^2 - (s_1^2 + ... + s_r^2)
+	err_sq = norm_sq - np.cumsum(s.astype(np.float64)**2)
+	r = int(np.searchsorted(-err_sq, -max_err_sq) + 1)
+	r = min(r, s.shape[0])
+
+	return np.matmul(Q, u_b[:, :r]), s[:r], v[:r, :]
@@ -0,0 +1,170 @@
+#
+#   Lazily loaded, disk-cached CIFAR-10 dataset shared by hw1/classify.py and hw2/CNNclassify.py
+#   The first call to load() downloads CIFAR-10 through keras (or generates the synthetic stand-in) and
+#   saves the images as uint8 .npy files. Every later call memory-maps those files, so nothing is
+#   read from disk until a batch is actually used. The images stay uint8 (N x 32 x 32 x 3, RGB) and
+#   each consumer normalizes one batch at a time in float32, with scale_batch (divide by 255) or
+#   center_batch (subtract the mean image).
+#
+#   The cache lives in $CIFAR10_CACHE_DIR (default ~/.keras/datasets/cifar10_npy). Setting
+#   CIFAR10_SYNTHETIC=1 swaps in a generated dataset of the same shapes and dtypes, so the
+#   networks can be run without network access.
+#
+#   load_image reads an image file with cv2 into the same uint8 RGB layout, so every network is fed
+#   single images in the channel order it was trained on (cv2 decodes to BGR).
+#
+#   Usage: python cifar10_cache.py [synthetic]     (builds the cache and prints a summary)
+#
+
+import os
+import sys
+import numpy as np
+
+image_shape = (32, 32, 3)
+num_labels = 10
+num_train = 50000
+num_test = 10000
+
+cache_dir = os.environ.get('CIFAR10_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.keras', 'datasets', 'cifar10_npy'))
+
+# Number of images handled at a time when generating the synthetic data or computing the mean image
+chunk_size = 5000
+
+# Datasets already mapped in this process, keyed by synthetic or not
+loaded = {}
+
+
+# Function to return whether the synthetic stand-in should be used (CIFAR10_SYNTHETIC=1)
+def use_synthetic(synthetic=None):
+	if synthetic is None:
+		return os.environ.get('CIFAR10_SYNTHETIC', '0') not in ('', '0')
+	return synthetic
+
+
+# Function to return the directory holding the cached .npy files
+def dataset_dir(synthetic):
+	return os.path.join(cache_dir, 'synthetic') if synthetic else cache_dir
+
+
+# Function to save an array as a .npy file, through a temporary file so an interrupted run never
+# leaves a partial cache behind
+def save_array(filename, array):
+	with open(filename + '.tmp', 'wb') as output_file:
+		np.save(output_file, array)
+	os.replace(filename + '.tmp', filename)
+
+
+# Function to generate the synthetic stand-in for CIFAR-10 straight into the cache directory
+# Every class gets its own smooth random color pattern, and each image is its class pattern with a
+# random brightness shift and pixel noise, so the networks can actually learn something from it
+def write_synthetic(directory, seed=0):
+	rng = np.random.RandomState(seed)
+	coarse = rng.uniform(0, 255, (num_labels, 4, 4, 3))
+	patterns = np.repeat(np.repeat(coarse, 8, axis=1), 8, axis=2).astype(np.float32)
+
+	for name, count in [('train', num_train), ('test', num_test)]:
+		labels = rng.randint(0, num_labels, count).astype(np.uint8)
+		filename = os.path.join(directory, name + '_x.npy')
+		images = np.lib.format.open_memmap(filename + '.tmp', mode='w+', dtype=np.uint8, shape=(count,) + image_shape)
+		for start in range(0, count, chunk_size):
+			y = labels[start:start + chunk_size]
+			shift = rng.uniform(-40, 40, (y.shape[0], 1, 1, 1))
+			noise = rng.normal(0, 30, (y.shape[0],) + image_shape)
+			images[start:start + chunk_size] = np.clip(patterns[y] + shift + noise, 0, 255)
+		images.flush()
+		del images
+		os.replace(filename + '.tmp', filename)
+		save_array(os.path.join(directory, name + '_y.npy'), labels)
+
+
+# Function to download CIFAR-10 through keras and save it into the cache directory
+def write_cifar10(directory):
+	from keras.datasets import cifar10
+	(x_train, y_train), (x_test, y_test) = cifar10.load_data()
+
+	save_array(os.path.join(directory, 'train_x.npy'), np.ascontiguousarray(x_train, dtype=np.uint8))
+	save_array(os.path.join(directory, 'train_y.npy'), np.squeeze(y_train).astype(np.uint8))
+	save_array(os.path.join(directory, 'test_x.npy'), np.ascontiguousarray(x_test, dtype=np.uint8))
+	save_array(os.path.join(directory, 'test_y.npy'), np.squeeze(y_test).astype(np.uint8))
+
+
+# Function to return the training and test data as ((x_train, y_train), (x_test, y_test))
+# The images are read-only uint8 memmaps of shape N x 32 x 32 x 3, and the labels are uint8 vectors
+def load(synthetic=None):
+	synthetic = use_synthetic(synthetic)
+	if synthetic in loaded:
+		return loaded[synthetic]
+
+	directory = dataset_dir(synthetic)
+	names = ['train_x', 'train_y', 'test_x', 'test_y']
+	if not all(os.path.exists(os.path.join(directory, name + '.npy')) for name in names):
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		if synthetic:
+			write_synthetic(directory)
+		else:
+			write_cifar10(directory)
+
+	x_train, y_train, x_test, y_test = [np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in names]
+	loaded[synthetic] = (x_train, y_train), (x_test, y_test)
+	return loaded[synthetic]
+
+
+# Function to return the float32 mean training image (32 x 32 x 3), computed once in chunks and cached
+def mean_image(synthetic=None):
+	synthetic = use_synthetic(synthetic)
+	filename = os.path.join(dataset_dir(synthetic), 'mean.npy')
+	if os.path.exists(filename):
+		return np.load(filename)
+
+	(x_train, _), _ = load(synthetic)
+	total = np.zeros(image_shape, dtype=np.float64)
+	for start in range(0, x_train.shape[0], chunk_size):
+		total += np.sum(x_train[start:start + chunk_size], axis=0, dtype=np.float64)
+	mean = (total / x_train.shape[0]).astype(np.float32)
+
+	save_array(filename, mean)
+	return mean
+
+
+# Function to convert an image decoded by cv2 (BGR, any size) into the 32 x 32 x 3 RGB layout of the data
+def convert_image(image):
+	import cv2
+	if image is None:
+		raise ValueError("Could not decode the image")
+	if image.shape[:2] != image_shape[:2]:
+		image = cv2.resize(image, image_shape[:2])
+	return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+# Function to read an image file into the 32 x 32 x 3 uint8 RGB layout of the data
+def load_image(image_path):
+	import cv2
+	return convert_image(cv2.imread(image_path, cv2.IMREAD_COLOR))
+
+
+# Function to write a uint8 RGB image to an image file (cv2 expects BGR)
+def save_image(image_path, image):
+	import cv2
+	cv2.imwrite(image_path, cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR))
+
+
+# Function to normalize a batch of uint8 images to float32 values between 0 and 1
+def scale_batch(images):
+	return np.multiply(images, np.float32(1.0 / 255.0), dtype=np.float32)
+
+
+# Function to normalize a batch of uint8 images to float32 by subtracting the mean image
+def center_batch(images, mean):
+	return np.subtract(images, mean, dtype=np.float32)
+
+
+if __name__ == '__main__':
+	synthetic = len(sys.argv) > 1 and sys.argv[1] == 'synthetic'
+	(x_train, y_train), (x_test, y_test) = load(synthetic or None)
+	mean = mean_image(synthetic or None)
+
+	print("\nCIFAR-10%s cached in %s" % (" (synthetic)" if use_synthetic(synthetic or None) else "", dataset_dir(use_synthetic(synthetic or None))))
+	print("Training images: %s %s, labels: %s" % (x_train.shape, x_train.dtype, y_train.shape))
+	print("Test images:     %s %s, labels: %s" % (x_test.shape, x_test.dtype, y_test.shape))
+	print("Mean pixel value: %.3f\n" % mean.mean())
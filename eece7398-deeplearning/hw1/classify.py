@@ -7,47 +7,24 @@
 #
 
 import tensorflow as tf
-from keras.datasets import cifar10 
-import cv2
 import numpy as np
 import sys
 import os
+import time
+import queue
+import threading
 
+# The CIFAR-10 data is shared with hw2 through the cifar10_cache module one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import cifar10_cache
 
-# Load in the CIFAR-10 training data and test data
-(x_train, y_train), (x_test, y_test) = cifar10.load_data()
-
-# # Code for writing certain test images out to png images for later image testing
-# cv2.imwrite('ex1.png', x_test[0])
-# cv2.imwrite('ex2.png', x_test[5001])
-# cv2.imwrite('ex3.png', x_test[10])
-# cv2.imwrite('ex4.png', x_test[9000])
-# cv2.imwrite('ex5.png', x_test[123])
-cv2.imwrite('ex1.png', x_test[10])
-cv2.imwrite('ex2.png', x_test[11])
-cv2.imwrite('ex3.png', x_test[12])
-cv2.imwrite('ex4.png', x_test[13])
-cv2.imwrite('ex5.png', x_test[14])
-
-# Reshape the training images into 1 x 3072 vectors, make the data type of the image data float32, 
-# and normalize the image data points to be between 0 and 1
-x_train = np.reshape(x_train, (x_train.shape[0], -1))
-x_train = x_train.astype('float32')
-x_train = x_train / 255.0
-
-# Reshape the test images into 1 x 3072 vectors, make the data type of the image data float32, 
-# and normalize the image data points to be between 0 and 1
-x_test = np.reshape(x_test, (x_test.shape[0], -1))
-x_test = x_test.astype('float32')
-x_test = x_test / 255.0
-
-# Reshape the training labels and test labels data to be vectors
-# The training labels will be a 50000 x 1 vector and the test labels will be a 10000 x 1 vector
-y_train = np.squeeze(y_train)
-y_test = np.squeeze(y_test)
+
+# The CIFAR-10 training data and test data are loaded lazily by cifar10_cache (as uint8 memory-mapped
+# images), so only the functions that need them read them. Each batch is reshaped into 1 x 3072 
+# vectors and normalized to float32 values between 0 and 1 when it is used (see prepare_images)
 
 # Define the number of input neurons as being equal to the vector size of one image (here, it will always be 3072)
-n_input = int(x_train.shape[1])
+n_input = int(np.prod(cifar10_cache.image_shape))
 
 # Define the number of neurons in the first hidden layer
 n_neurons = 2000
@@ -62,6 +39,43 @@ n_labels = 10
 cur_dir = os.getcwd()
 model_dir = str(cur_dir) + "/model/saved_model"
 
+# Define the filename of the frozen, inference-only graph written by export_frozen
+frozen_model_path = str(cur_dir) + "/model/frozen_model.pb"
+
+# Define the decay of the running batch normalization statistics, and the variance epsilon
+bn_decay = 0.99
+bn_epsilon = 1e-12
+
+# Define the training batch size, and the number of batches prepared ahead of the training loop
+batch_size = 128
+num_prefetch = 4
+
+# Define the number of images evaluated per run of the graph, and the number of randomly sampled 
+# test images used for the evaluations during training (the last evaluation always uses all of them)
+eval_chunk_size = 1000
+eval_samples = 2000
+
+
+
+# Function to write certain test images out to png images for later image testing
+# The images are RGB, and are converted to the BGR order cv2 writes (see cifar10_cache.save_image)
+def write_example_images(x_test):
+	# # Earlier choice of test images
+	# cifar10_cache.save_image('ex1.png', x_test[0])
+	# cifar10_cache.save_image('ex2.png', x_test[5001])
+	# cifar10_cache.save_image('ex3.png', x_test[10])
+	# cifar10_cache.save_image('ex4.png', x_test[9000])
+	# cifar10_cache.save_image('ex5.png', x_test[123])
+	cifar10_cache.save_image('ex1.png', x_test[10])
+	cifar10_cache.save_image('ex2.png', x_test[11])
+	cifar10_cache.save_image('ex3.png', x_test[12])
+	cifar10_cache.save_image('ex4.png', x_test[13])
+	cifar10_cache.save_image('ex5.png', x_test[14])
+
+
+# Function to reshape a batch of uint8 images into 1 x 3072 float32 vectors with values between 0 and 1
+def prepare_images(images):
+	return cifar10_cache.scale_batch(np.reshape(images, (images.shape[0], -1)))
 
 
 # Function to initialize the input data placeholder, true label placeholder, 
@@ -83,17 +97,56 @@ def configure_layers(n_input, n_neurons, n_labels):
 	return x, y_actual, W, b
 
 
+# Function to initialize the running mean and variance of both hidden layers, which are tracked 
+# during training and used in place of the batch statistics at inference time
+def configure_batch_norm(n_neurons, n_neurons_second):
+	bn = {
+		'first_layer': (tf.Variable(tf.zeros([n_neurons]), trainable=False, name="bn_mean1"), 
+			tf.Variable(tf.ones([n_neurons]), trainable=False, name="bn_var1")),
+		'second_layer': (tf.Variable(tf.zeros([n_neurons_second]), trainable=False, name="bn_mean2"), 
+			tf.Variable(tf.ones([n_neurons_second]), trainable=False, name="bn_var2"))
+	}
+
+	return bn
+
+
+# Function to batch normalize one hidden layer
+# In training, the layer is normalized with the statistics of the batch, and if the running statistics 
+# are given, ops updating them (exponential moving averages) are added to the UPDATE_OPS collection. 
+# Otherwise, the layer is normalized with the running statistics
+def batch_norm(layer, running, training):
+	if not training:
+		return tf.nn.batch_normalization(layer,running[0],running[1],None,None,bn_epsilon)
+
+	mean, variance = tf.nn.moments(layer,axes=[0])
+	if running is not None:
+		tf.add_to_collection(tf.GraphKeys.UPDATE_OPS, tf.assign(running[0], bn_decay * running[0] + (1 - bn_decay) * mean))
+		tf.add_to_collection(tf.GraphKeys.UPDATE_OPS, tf.assign(running[1], bn_decay * running[1] + (1 - bn_decay) * variance))
+	return tf.nn.batch_normalization(layer,mean,variance,None,None,bn_epsilon)
+
+
 # Function to make the actual neural network model 
 # Performs the linear classification between layers (the matrix multiplication y = Wx + b)
 # Also performs batch normalization and applies the ReLU activation function in each hidden layer
-def make_model(x, W, b):
+# (see batch_norm for how the running statistics bn are used)
+def make_model(x, W, b, bn=None, training=True):
+	bn = bn or {'first_layer': None, 'second_layer': None}
+
 	first = tf.matmul(x, W['first_layer']) + b['first_layer']
-	mean1, variance1 = tf.nn.moments(first,axes=[0])
-	layer_one = tf.nn.relu(tf.nn.batch_normalization(first,mean1,variance1,None,None,1e-12))
+	layer_one = tf.nn.relu(batch_norm(first, bn['first_layer'], training))
 
 	second = tf.matmul(layer_one, W['second_layer']) + b['second_layer']
-	mean2, variance2 = tf.nn.moments(second,axes=[0])
-	layer_two = tf.nn.relu(tf.nn.batch_normalization(second,mean2,variance2,None,None,1e-12))
+	layer_two = tf.nn.relu(batch_norm(second, bn['second_layer'], training))
+	y_pred = tf.matmul(layer_two,W['out_layer']) + b['out_layer']
+
+	return y_pred
+
+
+# Function to make the inference-only model, with the batch normalization already folded into the 
+# weights and biases of the hidden layers (see fold_batch_norm)
+def make_folded_model(x, W, b):
+	layer_one = tf.nn.relu(tf.matmul(x, W['first_layer']) + b['first_layer'])
+	layer_two = tf.nn.relu(tf.matmul(layer_one, W['second_layer']) + b['second_layer'])
 	y_pred = tf.matmul(layer_two,W['out_layer']) + b['out_layer']
 
 	return y_pred
@@ -114,24 +167,106 @@ def get_accuracy(y_actual,y_pred):
 	return accuracy
 
 
+# Function to iterate over the training data in random batches, one epoch at a time
+# Only an index array is shuffled (once per epoch), and only the rows of each batch are copied out
+# of the data. The indices of a batch are sorted so the rows are gathered in memory order
+def batch_iterator(x_data, y_data, batch_size, seed=None):
+	rng = np.random.RandomState(seed)
+	while True:
+		shuff = rng.permutation(x_data.shape[0])
+		for start in range(0, x_data.shape[0] - batch_size + 1, batch_size):
+			ind = np.sort(shuff[start:start + batch_size])
+			yield prepare_images(x_data.take(ind, axis=0)), y_data.take(ind, axis=0).astype(np.int64)
+
+
+# Function to prepare the batches of an iterator in a background thread, keeping up to 
+# num_batches of them ready, so the batch gathering overlaps with the training steps
+# The worker ends the queue with an end marker (along with the exception, if the iterator raised one), 
+# so the prefetched iterator ends, or raises, where the original one did
+def prefetch(iterator, num_batches=num_prefetch):
+	batches = queue.Queue(maxsize=num_batches)
+	end = object()
+
+	def worker():
+		try:
+			for batch in iterator:
+				batches.put((batch, None))
+			batches.put((end, None))
+		except Exception as e:
+			batches.put((end, e))
+
+	thread = threading.Thread(target=worker)
+	thread.daemon = True
+	thread.start()
+
+	while True:
+		batch, error = batches.get()
+		if error is not None:
+			raise error
+		if batch is end:
+			return
+		yield batch
+
+
+# Function to return the batches picked by the original training loop, which shuffled and copied 
+# the whole training set for every batch (only kept for the benchmark below)
+def shuffle_copy_iterator(x_data, y_data, batch_size):
+	while True:
+		shuff = np.arange(x_data.shape[0]) 
+		np.random.shuffle(shuff)
+		xTr = x_data[shuff]
+		yTr = y_data[shuff]
+		yield xTr[:batch_size], yTr[:batch_size]
+
+
+# Function to evaluate the network's loss and accuracy on a data set, eval_chunk_size images at a time
+# The loss and accuracy of every chunk are averages over the chunk, so they are summed weighted by the 
+# chunk size and divided by the number of images at the end. If num_samples is given, only a random 
+# subset of that many images is evaluated
+def evaluate(sess, loss, accuracy, x, y_actual, x_data, y_data, chunk_size=eval_chunk_size, num_samples=None):
+	ind = np.arange(x_data.shape[0])
+	if num_samples is not None and num_samples < x_data.shape[0]:
+		ind = np.sort(np.random.choice(x_data.shape[0], num_samples, replace=False))
+
+	loss_sum = 0.0
+	correct_sum = 0.0
+	for start in range(0, ind.shape[0], chunk_size):
+		chunk = ind[start:start + chunk_size]
+		chunk_loss, chunk_acc = sess.run([loss, accuracy], feed_dict={x: prepare_images(x_data.take(chunk, axis=0)), y_actual: y_data.take(chunk, axis=0).astype(np.int64)})
+		loss_sum += chunk_loss * chunk.shape[0]
+		correct_sum += chunk_acc * chunk.shape[0]
+
+	return loss_sum / ind.shape[0], correct_sum / ind.shape[0]
+
+
 # Main function for training the neural network 
 def train():
-	# Initialize the layers using the configure_layers function
+	(x_train, y_train), (x_test, y_test) = cifar10_cache.load()
+	write_example_images(x_test)
+
+	# Initialize the layers using the configure_layers function, and the running batch normalization statistics
 	x, y_actual, W, b = configure_layers(n_input, n_neurons, n_labels)
+	bn = configure_batch_norm(n_neurons, n_neurons_second)
 	# Make and apply the actual model to determine the predicted output of the network
-	y_pred = make_model(x,W,b)
+	y_pred = make_model(x,W,b,bn)
 	# Compute the loss of the network's output
 	loss = get_loss(y_actual,y_pred)
 	# Compute the accuracy of the network's output
 	accuracy = get_accuracy(y_actual,y_pred)
 
+	# The test set is evaluated with the running statistics, the same way the saved model is used
+	y_eval = make_model(x,W,b,bn,training=False)
+	eval_loss = get_loss(y_actual,y_eval)
+	eval_accuracy = get_accuracy(y_actual,y_eval)
+
 	# Use the gradient descent optimizer to determine in what direction and by how much to  
 	# adjust the weights and biases for the next training step
 	# train_step = tf.train.GradientDescentOptimizer(0.4).minimize(loss)
 
 	# Use the adam optimizer to determine in what direction and by how much to  
-	# adjust the weights and biases for the next training step
-	train_step = tf.train.AdamOptimizer(learning_rate=0.001, beta1=0.9, beta2=0.999, epsilon=1e-08).minimize(loss)
+	# adjust the weights and biases for the next training step (the running statistics are updated with every step)
+	with tf.control_dependencies(tf.get_collection(tf.GraphKeys.UPDATE_OPS)):
+		train_step = tf.train.AdamOptimizer(learning_rate=0.001, beta1=0.9, beta2=0.999, epsilon=1e-08).minimize(loss)
 
 	# Initialize and run the Tensorflow session
 	sess = tf.InteractiveSession()
@@ -141,25 +276,22 @@ def train():
 	print("\nLoop | Training Loss | Training Accuracy (%) | Test Set Loss | Test Set Accuracy (%)")
 	print("------------------------------------------------------------------------------------")
 
+	# Random batches of 128 images from the training data, reshuffled every epoch and prepared 
+	# in the background while the network trains
+	batches = prefetch(batch_iterator(x_train, y_train, batch_size))
+
 	# Perform 2000 training iterations
 	for i in range(2001):
-		# Shuffle the training data before each iteration to always pick a random batch of 128 
-		# images from the training data 
-		shuff = np.arange(x_train.shape[0]) 
-		np.random.shuffle(shuff)
-		xTr = x_train[shuff]
-		yTr = y_train[shuff]
-		batch_xs = xTr[:128]
-		batch_ys = yTr[:128]
+		batch_xs, batch_ys = next(batches)
 
 		# Run the batch through the neural network, and return the loss, training step, and accuracy of the network for that batch
 		loss_out, step, acc = sess.run([loss, train_step, accuracy], feed_dict={x: batch_xs, y_actual: batch_ys}) 
 
 		# Consider every 100 iterations to be a training "epoch"
-		# At this point, test the neural network on all of the testing data
-		# Print both the training and testing results to the user
+		# At this point, test the neural network on a random sample of the testing data (or all of it 
+		# after the last iteration), and print both the training and testing results to the user
 		if (i % 100) == 0: 
-			test_loss, test_acc = sess.run([loss, accuracy], feed_dict={x: x_test, y_actual: y_test})
+			test_loss, test_acc = evaluate(sess, eval_loss, eval_accuracy, x, y_actual, x_test, y_test, num_samples=None if i == 2000 else eval_samples)
 			print(" " + str(int((i / 100) + 1)) + "      " + str(loss_out) + "            " + str(("{0:.3f}".format(acc * 100))) + "              " + str(test_loss) + "         " + str(("{0:.3f}".format(test_acc * 100)))) 
 	 	
 	# Save the model to the model folder 
@@ -167,6 +299,150 @@ def train():
 	save_path = saver.save(sess, model_dir)	
 
 
+# Function to compare the training speed (steps/sec) of the original shuffle-and-copy batches with 
+# the epoch-based batches, both fed directly and through the prefetching thread
+def benchmark(num_steps=200):
+	(x_train, y_train), _ = cifar10_cache.load()
+	# The original loop kept the whole normalized training set in memory
+	x_full = prepare_images(x_train)
+	y_full = y_train.astype(np.int64)
+
+	x, y_actual, W, b = configure_layers(n_input, n_neurons, n_labels)
+	y_pred = make_model(x,W,b)
+	loss = get_loss(y_actual,y_pred)
+	train_step = tf.train.AdamOptimizer(learning_rate=0.001, beta1=0.9, beta2=0.999, epsilon=1e-08).minimize(loss)
+
+	sess = tf.InteractiveSession()
+	tf.global_variables_initializer().run()
+
+	pipelines = [
+		('shuffle + copy', lambda: shuffle_copy_iterator(x_full, y_full, batch_size)),
+		('index batches', lambda: batch_iterator(x_train, y_train, batch_size)),
+		('index + prefetch', lambda: prefetch(batch_iterator(x_train, y_train, batch_size)))
+	]
+
+	print("\n{0:>18} | {1:>14} | {2:>14} | {3:>10}".format("Batches", "Input only/s", "Train steps/s", "Speedup"))
+	print("-------------------------------------------------------------------")
+	base = None
+	for name, make_batches in pipelines:
+		# Time producing the batches on their own, then full training steps fed by them
+		batches = make_batches()
+		start = time.perf_counter()
+		for i in range(num_steps):
+			next(batches)
+		input_rate = num_steps / (time.perf_counter() - start)
+
+		batches = make_batches()
+		batch_xs, batch_ys = next(batches)
+		sess.run(train_step, feed_dict={x: batch_xs, y_actual: batch_ys})
+		start = time.perf_counter()
+		for i in range(num_steps):
+			batch_xs, batch_ys = next(batches)
+			sess.run(train_step, feed_dict={x: batch_xs, y_actual: batch_ys})
+		train_rate = num_steps / (time.perf_counter() - start)
+
+		base = base or train_rate
+		print("{0:>18} | {1:>14.1f} | {2:>14.1f} | {3:>9.2f}x".format(name, input_rate, train_rate, train_rate / base))
+	print("")
+
+
+# Function to fold the running batch normalization statistics into the weights and biases (as numpy arrays)
+# For a hidden layer, BN(xW + b) = (xW + b - mean) / sqrt(var + eps) = x W' + b', with
+#     W' = W / sqrt(var + eps)   (scaling every column)   and   b' = (b - mean) / sqrt(var + eps)
+def fold_batch_norm(W, b, bn):
+	W = dict(W)
+	b = dict(b)
+	for layer in ['first_layer', 'second_layer']:
+		mean, variance = bn[layer]
+		scale = 1.0 / np.sqrt(variance + bn_epsilon)
+		W[layer] = W[layer] * scale
+		b[layer] = (b[layer] - mean) * scale
+
+	return W, b
+
+
+# Function to restore the trained model and write it as a frozen, inference-only graph 
+# The batch normalization is folded into w1/b1 and w2/b2, and all variables are turned into constants, 
+# so the graph has no moment ops and its output for an image doesn't depend on the rest of the batch. 
+# The graph takes "x" and outputs "y_pred" (logits) and "prediction" (class index)
+def export_frozen(frozen_path=frozen_model_path):
+	with tf.Graph().as_default():
+		_, _, W, b = configure_layers(n_input, n_neurons, n_labels)
+		bn = configure_batch_norm(n_neurons, n_neurons_second)
+		with tf.Session() as sess:
+			tf.train.Saver().restore(sess, tf.train.latest_checkpoint(str(cur_dir) + "/model/"))
+			W_out, b_out, bn_out = sess.run([W, b, bn])
+
+	W_folded, b_folded = fold_batch_norm(W_out, b_out, bn_out)
+
+	with tf.Graph().as_default() as graph:
+		x = tf.placeholder(tf.float32, [None, n_input], name="x")
+		W = {layer: tf.Variable(W_folded[layer]) for layer in W_folded}
+		b = {layer: tf.Variable(b_folded[layer]) for layer in b_folded}
+		y_pred = tf.identity(make_folded_model(x, W, b), name="y_pred")
+		tf.argmax(y_pred, 1, name="prediction")
+		with tf.Session() as sess:
+			sess.run(tf.global_variables_initializer())
+			frozen = tf.graph_util.convert_variables_to_constants(sess, graph.as_graph_def(), ["y_pred", "prediction"])
+
+	tf.train.write_graph(frozen, os.path.dirname(frozen_path), os.path.basename(frozen_path), as_text=False)
+	return frozen_path
+
+
+# Function to load a frozen graph written by export_frozen, returning (session, x, y_pred, prediction)
+def load_frozen(frozen_path=frozen_model_path):
+	graph_def = tf.GraphDef()
+	with open(frozen_path, 'rb') as frozen_file:
+		graph_def.ParseFromString(frozen_file.read())
+
+	graph = tf.Graph()
+	with graph.as_default():
+		tf.import_graph_def(graph_def, name="")
+	sess = tf.Session(graph=graph)
+
+	return sess, graph.get_tensor_by_name("x:0"), graph.get_tensor_by_name("y_pred:0"), graph.get_tensor_by_name("prediction:0")
+
+
+# Function to compare the frozen graph with the restored model on single-image latency, agreement 
+# with the running statistics model, and whether single images give the same result as a full batch
+def compare_frozen(frozen_path=frozen_model_path, num_images=500):
+	_, (x_test, y_test) = cifar10_cache.load()
+	images = prepare_images(x_test[:num_images])
+
+	models = []
+	for name, training in [('batch moments', True), ('running stats', False)]:
+		graph = tf.Graph()
+		with graph.as_default():
+			x, _, W, b = configure_layers(n_input, n_neurons, n_labels)
+			bn = configure_batch_norm(n_neurons, n_neurons_second)
+			y_pred = make_model(x, W, b, bn, training=training)
+			sess = tf.Session(graph=graph)
+			tf.train.Saver().restore(sess, tf.train.latest_checkpoint(str(cur_dir) + "/model/"))
+		models.append((name, sess, x, y_pred))
+	sess, x, y_pred, _ = load_frozen(frozen_path)
+	models.append(('frozen + folded', sess, x, y_pred))
+
+	print("\n{0:>16} | {1:>16} | {2:>14} | {3:>16} | {4:>12}".format("Model", "Batch-1 latency", "Accuracy (%)", "Max |batch - 1|", "Max |diff|"))
+	print("---------------------------------------------------------------------------------------")
+	reference = None
+	for name, sess, x, y_pred in models:
+		batch_out = sess.run(y_pred, feed_dict={x: images})
+		sess.run(y_pred, feed_dict={x: images[:1]})
+		single_out = np.zeros_like(batch_out)
+		start = time.perf_counter()
+		for i in range(num_images):
+			single_out[i] = sess.run(y_pred, feed_dict={x: images[i:i + 1]})[0]
+		latency = (time.perf_counter() - start) / num_images
+
+		# Differences against the running statistics model, which the frozen graph should reproduce
+		if name == 'running stats':
+			reference = batch_out
+		diff = "-" if reference is None else "{0:.2e}".format(np.max(np.abs(batch_out - reference)))
+		acc = np.mean(np.argmax(batch_out, 1) == y_test[:num_images]) * 100
+		print("{0:>16} | {1:>13.3f} ms | {2:>14.2f} | {3:>16.2e} | {4:>12}".format(name, latency * 1000, acc, np.max(np.abs(batch_out - single_out)), diff))
+	print("")
+
+
 # Main function for testing the neural network 
 def test(image_path):
 	# Create a new Tensorflow session 
@@ -197,8 +473,14 @@ def test(image_path):
 	W = {'first_layer': w1, 'second_layer': w2, 'out_layer': w3}
 	b = {'first_layer': b1, 'second_layer': b2, 'out_layer': b3}
 
+	# Call back the running batch normalization statistics
+	bn = {
+		'first_layer': (graph.get_tensor_by_name("bn_mean1:0"), graph.get_tensor_by_name("bn_var1:0")),
+		'second_layer': (graph.get_tensor_by_name("bn_mean2:0"), graph.get_tensor_by_name("bn_var2:0"))
+	}
+
 	# Define method for making and applying the neural network model using the saved variables and recalled placeholders
-	y_pred = make_model(x,W,b)
+	y_pred = make_model(x,W,b,bn,training=False)
 	# Define method for returning the loss of the saved neural network's results
 	loss = get_loss(y_actual,y_pred)
 	# Define method for returning the accuracy of the saved neural network's results
@@ -207,20 +489,16 @@ def test(image_path):
 	print("Model restored\n")
 
 	if image_path == None: 
-		# Run the full test data set through the saved (i.e. already trained) neural network 
-		test_loss, test_acc, y_pred = sess.run([loss, accuracy, y_pred], feed_dict={x: x_test, y_actual: y_test})
+		_, (x_test, y_test) = cifar10_cache.load()
+		# Run the full test data set through the saved (i.e. already trained) neural network, in chunks
+		test_loss, test_acc = evaluate(sess, loss, accuracy, x, y_actual, x_test, y_test)
 		
 		# Print Results to the user
 		print("Full Test Set Loss:         " + str(test_loss))
 		print("Full Test Set Accuracy (%): " + str(("{0:.3f}".format(test_acc * 100))) + "\n")
 	else: 
-		test_image = cv2.imread(image_path,1)
-		# cv2.imshow('image',test_image)
-		# cv2.waitKey(0)
-		# cv2.destroyAllWindows()
-		test_image = np.reshape(test_image, (1, -1))
-		test_image = test_image.astype('float32')
-		test_image = test_image / 255.0
+		# Read the image in the RGB order of the training data (cv2 reads BGR)
+		test_image = prepare_images(np.expand_dims(cifar10_cache.load_image(image_path), axis=0))
 
 		pred = sess.run(tf.argmax(y_pred, 1), feed_dict={x: test_image})
 		# print(pred)
@@ -229,7 +507,6 @@ def test(image_path):
 		label_list = ['airplane', 'automobile', 'bird', 'cat', 'deer', 'dog', 'frog', 'horse', 'ship', 'truck']
 
 		print("The neural network predicts that the input image is a....  " + label_list[pred_index] + "\n")
-		print("NOTE: This function does not seem to be working properly. However, as it was no longer required for the homework assignment, I did not figure out a way to fix it.\n")
 
 
 
@@ -242,7 +519,15 @@ if __name__ == '__main__':
 				test(sys.argv[2])
 			else: 
 				test(None)
+		elif sys.argv[1] == 'export':
+			print("Frozen graph written to " + export_frozen())
+			compare_frozen()
+		elif sys.argv[1] == 'bench':
+			if len(sys.argv) == 3: 
+				benchmark(int(sys.argv[2]))
+			else: 
+				benchmark()
 	else:
 		print("\nNot a valid argument, please use an argument in one of the following formats...")
-		print("python classify.py train\npython classify.py test\n")
+		print("python classify.py train\npython classify.py test\npython classify.py export\npython classify.py bench [num_steps]\n")
 
@@ -0,0 +1,233 @@
+#
+#   Long-lived prediction server for the classify.py network
+#   The trained model is restored once, and images are classified over HTTP. Concurrent requests are
+#   queued and grouped into micro-batches, so the network runs once per batch instead of once per
+#   image. A batch is sent as soon as max_batch_size images are waiting, or max_wait_ms after its
+#   first image arrived.
+#       POST /predict    body is an encoded image (png, jpg, ...), answers {"label": ..., "index": ...}
+#       GET  /stats      answers the number of requests and batches served so far
+#
+#   Usage: python classify_server.py serve [port]
+#          python classify_server.py bench [num_requests]     (load test against a local server)
+#
+
+import sys
+import json
+import time
+import threading
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+import classify
+import cifar10_cache
+
+label_list = ['airplane', 'automobile', 'bird', 'cat', 'deer', 'dog', 'frog', 'horse', 'ship', 'truck']
+
+default_port = 8500
+max_batch_size = 64
+max_wait_ms = 5
+
+# Number of concurrent clients used by the load test
+bench_clients = [1, 8, 32]
+
+
+class Predictor (object):
+	# Build the network in its own graph and restore the trained weights from model_dir, once
+	def __init__ (self, model_dir=classify.cur_dir + "/model/", max_batch_size=max_batch_size, max_wait_ms=max_wait_ms):
+		self.max_batch_size = max_batch_size
+		self.max_wait = max_wait_ms / 1000.0
+
+		self.graph = tf.Graph()
+		with self.graph.as_default():
+			self.x, _, W, b = classify.configure_layers(classify.n_input, classify.n_neurons, classify.n_labels)
+			bn = classify.configure_batch_norm(classify.n_neurons, classify.n_neurons_second)
+			# Using the running batch normalization statistics, so an image's prediction doesn't depend on
+			# the other images in its batch
+			self.prediction = tf.argmax(classify.make_model(self.x, W, b, bn, training=False), 1)
+			self.sess = tf.Session()
+			tf.train.Saver().restore(self.sess, tf.train.latest_checkpoint(model_dir))
+
+		self.requests = []
+		self.lock = threading.Lock()
+		self.ready = threading.Condition(self.lock)
+		self.num_requests = 0
+		self.num_batches = 0
+
+		self.thread = threading.Thread(target=self.batch_loop)
+		self.thread.daemon = True
+		self.thread.start()
+
+	# Function to queue one image (32 x 32 x 3, uint8 RGB) and return a Future for its class index
+	def submit(self, image):
+		future = Future()
+		with self.lock:
+			self.requests.append((image, future))
+			self.ready.notify()
+		return future
+
+	# Function to classify a batch of images directly, without going through the queue
+	def predict(self, images):
+		return self.sess.run(self.prediction, feed_dict={self.x: classify.prepare_images(images)})
+
+	# Function run in the background thread to take batches of queued images through the network
+	def batch_loop(self):
+		while True:
+			with self.lock:
+				while not self.requests:
+					self.ready.wait()
+
+				# Wait for more requests until the batch is full or the first one has waited long enough
+				deadline = time.perf_counter() + self.max_wait
+				while len(self.requests) < self.max_batch_size:
+					remaining = deadline - time.perf_counter()
+					if remaining <= 0:
+						break
+					self.ready.wait(remaining)
+
+				batch = self.requests[:self.max_batch_size]
+				del self.requests[:self.max_batch_size]
+
+			try:
+				pred = self.predict(np.stack([image for image, _ in batch]))
+				for (_, future), index in zip(batch, pred):
+					future.set_result(int(index))
+			except Exception as e:
+				for _, future in batch:
+					future.set_exception(e)
+
+			with self.lock:
+				self.num_requests += len(batch)
+				self.num_batches += 1
+
+
+# Function to decode an encoded image into the 32 x 32 x 3 RGB layout of the CIFAR-10 data, the same
+# way classify.py test reads image files (see cifar10_cache.load_image)
+def decode_image(data):
+	return cifar10_cache.convert_image(cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR))
+
+
+# Function to make the HTTP request handler class for a predictor
+def make_handler(predictor):
+	class PredictHandler (BaseHTTPRequestHandler):
+		def send_json(self, code, body):
+			data = json.dumps(body).encode()
+			self.send_response(code)
+			self.send_header('Content-Type', 'application/json')
+			self.send_header('Content-Length', str(len(data)))
+			self.end_headers()
+			self.wfile.write(data)
+
+		def do_POST(self):
+			if self.path != '/predict':
+				return self.send_json(404, {'error': 'unknown path %s' % self.path})
+			try:
+				length = int(self.headers.get('Content-Length', 0))
+			except ValueError:
+				return self.send_json(400, {'error': 'invalid Content-Length'})
+			if length <= 0:
+				return self.send_json(400, {'error': 'empty request body, expected an encoded image'})
+
+			# cv2.imdecode raises cv2.error (rather than returning None) for some malformed bodies
+			try:
+				image = decode_image(self.rfile.read(length))
+			except (ValueError, cv2.error) as e:
+				return self.send_json(400, {'error': str(e)})
+
+			try:
+				index = predictor.submit(image).result()
+			except Exception as e:
+				return self.send_json(500, {'error': 'prediction failed: %s' % e})
+			self.send_json(200, {'label': label_list[index], 'index': index})
+
+		def do_GET(self):
+			if self.path != '/stats':
+				return self.send_json(404, {'error': 'unknown path %s' % self.path})
+			self.send_json(200, {'requests': predictor.num_requests, 'batches': predictor.num_batches})
+
+		# Keep the per-request logging quiet, it would dominate the load test
+		def log_message(self, format, *args):
+			pass
+
+	return PredictHandler
+
+
+# HTTP server with one thread per connection, and a listen backlog large enough for bursts of clients
+class PredictServer (ThreadingHTTPServer):
+	daemon_threads = True
+	request_queue_size = 128
+
+
+# Function to start the HTTP server for a predictor in a background thread, returning the server
+def start_server(predictor, port=default_port):
+	server = PredictServer(('127.0.0.1', port), make_handler(predictor))
+	thread = threading.Thread(target=server.serve_forever)
+	thread.daemon = True
+	thread.start()
+	return server
+
+
+# Function to send num_requests test images from num_clients concurrent clients to a server,
+# returning (latencies in seconds, total seconds)
+def load_test(url, images, num_requests, num_clients):
+	def send(i):
+		request = urllib.request.Request(url + '/predict', data=images[i % len(images)], method='POST')
+		start = time.perf_counter()
+		with urllib.request.urlopen(request) as response:
+			response.read()
+		return time.perf_counter() - start
+
+	start = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=num_clients) as pool:
+		latencies = list(pool.map(send, range(num_requests)))
+	return np.array(latencies), time.perf_counter() - start
+
+
+# Function to load test a local server at several levels of concurrency
+def benchmark(num_requests=2000):
+	# Restoring the model is what every run of 'classify.py test image' pays before classifying one image
+	start = time.perf_counter()
+	predictor = Predictor()
+	print("\nModel restored in %.3f s" % (time.perf_counter() - start))
+
+	server = start_server(predictor, 0)
+	url = 'http://127.0.0.1:%d' % server.server_address[1]
+
+	_, (x_test, _) = cifar10_cache.load()
+	images = [cv2.imencode('.png', cv2.cvtColor(np.asarray(x_test[i]), cv2.COLOR_RGB2BGR))[1].tobytes() for i in range(256)]
+
+	# Warm up the session before timing
+	load_test(url, images, 32, 8)
+
+	print("{0:>8} | {1:>10} | {2:>10} | {3:>10} | {4:>10}".format("Clients", "p50 (ms)", "p99 (ms)", "Images/s", "Avg batch"))
+	print("------------------------------------------------------------")
+	for num_clients in bench_clients:
+		requests_before, batches_before = predictor.num_requests, predictor.num_batches
+		latencies, seconds = load_test(url, images, num_requests, num_clients)
+		avg_batch = (predictor.num_requests - requests_before) / float(max(1, predictor.num_batches - batches_before))
+		print("{0:>8} | {1:>10.2f} | {2:>10.2f} | {3:>10.1f} | {4:>10.1f}".format(num_clients, np.percentile(latencies, 50) * 1000,
+			np.percentile(latencies, 99) * 1000, num_requests / seconds, avg_batch))
+	print("")
+
+	server.shutdown()
+
+
+if __name__ == '__main__':
+	if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+		port = int(sys.argv[2]) if len(sys.argv) > 2 else default_port
+		server = start_server(Predictor(), port)
+		print("Model restored, serving on http://127.0.0.1:%d (POST /predict, GET /stats)" % port)
+		try:
+			while True:
+				time.sleep(3600)
+		except KeyboardInterrupt:
+			server.shutdown()
+	elif len(sys.argv) > 1 and sys.argv[1] == 'bench':
+		benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
+	else:
+		print("\nNot a valid argument, please use an argument in one of the following formats...")
+		print("python classify_server.py serve [port]\npython classify_server.py bench [num_requests]\n")
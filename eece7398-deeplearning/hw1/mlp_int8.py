@@ -0,0 +1,193 @@
+#
+#   TensorFlow-free, int8 quantized inference for the classify.py network
+#   'export' restores the trained model once (this step needs TensorFlow), folds the batch normalization
+#   into the hidden layers (see classify.fold_batch_norm) and saves the 3072 -> 2000 -> 1000 -> 10
+#   weights to an .npz file as int8, with one float32 scale per output neuron (per-channel quantization).
+#   Classifying then only needs numpy...
+#       - the uint8 pixels are used directly as the integer input of the first layer (the 1/255 of the
+#         normalization is folded into the first layer's scales)
+#       - the output of every hidden layer is quantized to 0..127 with one scale per image
+#       - the integer products are accumulated in int32, and then rescaled to float32 with the
+#         input and weight scales
+#   numpy's integer matmul doesn't use BLAS, so the products are computed by float32 BLAS over blocks of
+#   inputs small enough that every partial sum is an exact integer (below 2^24), and the blocks are
+#   summed in int32.
+#
+#   Usage: python mlp_int8.py export
+#          python mlp_int8.py test [image]
+#          python mlp_int8.py bench
+#
+
+import os
+import sys
+import time
+import subprocess
+import numpy as np
+
+# The CIFAR-10 data is shared with hw2 through the cifar10_cache module one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import cifar10_cache
+
+int8_model_path = os.getcwd() + "/model/mlp_int8.npz"
+
+layers = ['first_layer', 'second_layer', 'out_layer']
+label_list = ['airplane', 'automobile', 'bird', 'cat', 'deer', 'dog', 'frog', 'horse', 'ship', 'truck']
+
+# Largest integer float32 represents exactly, which bounds the partial sums of int_matmul
+exact_float32 = 2**24
+
+# Number of test images classified per call during the benchmark
+bench_batch_size = 1000
+
+
+# Function to quantize each column (output neuron) of a weight matrix to int8
+# Returns (int8 weights, float32 scale per column)
+def quantize_columns(W):
+	scale = np.max(np.absolute(W), axis=0) / 127.0
+	scale[scale == 0] = 1.0
+	q = np.rint(W / scale).astype(np.int8)
+	return q, scale.astype(np.float32)
+
+
+# Function to restore the trained classify.py model, fold its batch normalization and save the
+# quantized weights to npz_path
+def export(npz_path=int8_model_path):
+	import tensorflow as tf
+	import classify
+
+	with tf.Graph().as_default():
+		_, _, W, b = classify.configure_layers(classify.n_input, classify.n_neurons, classify.n_labels)
+		bn = classify.configure_batch_norm(classify.n_neurons, classify.n_neurons_second)
+		with tf.Session() as sess:
+			tf.train.Saver().restore(sess, tf.train.latest_checkpoint(os.path.dirname(npz_path)))
+			W_out, b_out, bn_out = sess.run([W, b, bn])
+
+	W_folded, b_folded = classify.fold_batch_norm(W_out, b_out, bn_out)
+
+	arrays = {}
+	for i, layer in enumerate(layers):
+		arrays['w%d' % (i + 1)], arrays['w%d_scale' % (i + 1)] = quantize_columns(W_folded[layer])
+		arrays['b%d' % (i + 1)] = b_folded[layer].astype(np.float32)
+	np.savez(npz_path, **arrays)
+
+	return npz_path
+
+
+# Function to multiply an integer valued float32 matrix x (entries within +-max_input) by the int8
+# weights w (widened to float32), accumulating in int32
+# Every block of inputs is small enough that its partial sums stay below 2^24, so the float32 BLAS
+# products are exact integers
+def int_matmul(x, w, max_input):
+	block = max(1, (exact_float32 - 1) // (max_input * 127))
+	acc = np.zeros((x.shape[0], w.shape[1]), dtype=np.int32)
+	for start in range(0, x.shape[1], block):
+		acc += np.matmul(x[:, start:start + block], w[start:start + block]).astype(np.int32)
+	return acc
+
+
+# Function to quantize the (non-negative) output of a hidden layer to the integers 0..127, with one
+# scale per image. Returns (integer valued float32 matrix, float32 scale per row)
+def quantize_rows(h):
+	scale = np.max(h, axis=1) / 127.0
+	scale[scale == 0] = 1.0
+	return np.rint(h / scale[:, None]), scale.astype(np.float32)
+
+
+class Int8MLP (object):
+	# Load the quantized weights, widening them once to float32 for int_matmul
+	def __init__ (self, npz_path=int8_model_path):
+		with np.load(npz_path) as arrays:
+			self.w = [arrays['w%d' % i].astype(np.float32) for i in range(1, 4)]
+			self.scale = [arrays['w%d_scale' % i] for i in range(1, 4)]
+			self.b = [arrays['b%d' % i] for i in range(1, 4)]
+
+	# Function to return the logits for a batch of uint8 images (N x 32 x 32 x 3 or N x 3072)
+	def logits(self, images):
+		x = np.reshape(images, (images.shape[0], -1)).astype(np.float32)
+		acc = int_matmul(x, self.w[0], 255)
+		h = np.maximum(acc.astype(np.float32) * (self.scale[0] / 255.0) + self.b[0], 0)
+
+		for i in [1, 2]:
+			x, x_scale = quantize_rows(h)
+			acc = int_matmul(x, self.w[i], 127)
+			h = acc.astype(np.float32) * (x_scale[:, None] * self.scale[i]) + self.b[i]
+			if i < 2:
+				h = np.maximum(h, 0)
+
+		return h
+
+	# Function to return the predicted class index of every image, batch_size images at a time
+	def predict(self, images, batch_size=bench_batch_size):
+		return np.concatenate([np.argmax(self.logits(images[start:start + batch_size]), 1) for start in range(0, images.shape[0], batch_size)])
+
+
+# Function to time a fresh process that loads one of the models and classifies one image
+def startup_time(engine):
+	start = time.perf_counter()
+	subprocess.check_call([sys.executable, os.path.abspath(__file__), 'startup', engine])
+	return time.perf_counter() - start
+
+
+# Function run in the fresh process started by startup_time
+def startup(engine):
+	_, (x_test, _) = cifar10_cache.load()
+	if engine == 'tf':
+		import classify
+		sess, x, _, prediction = classify.load_frozen()
+		sess.run(prediction, feed_dict={x: classify.prepare_images(x_test[:1])})
+	else:
+		Int8MLP().predict(x_test[:1])
+
+
+# Function to compare the int8 engine with the frozen TensorFlow graph (classify.py export) on startup
+# time, throughput and accuracy over the CIFAR-10 test set
+def benchmark():
+	import classify
+
+	_, (x_test, y_test) = cifar10_cache.load()
+	x_test = np.asarray(x_test)
+
+	tf_startup = startup_time('tf')
+	int8_startup = startup_time('int8')
+
+	sess, x, _, prediction = classify.load_frozen()
+	sess.run(prediction, feed_dict={x: classify.prepare_images(x_test[:bench_batch_size])})
+	start = time.perf_counter()
+	tf_pred = np.concatenate([sess.run(prediction, feed_dict={x: classify.prepare_images(x_test[i:i + bench_batch_size])}) for i in range(0, x_test.shape[0], bench_batch_size)])
+	tf_seconds = time.perf_counter() - start
+
+	model = Int8MLP()
+	model.predict(x_test[:bench_batch_size])
+	start = time.perf_counter()
+	int8_pred = model.predict(x_test)
+	int8_seconds = time.perf_counter() - start
+
+	tf_acc = np.mean(tf_pred == y_test) * 100
+	int8_acc = np.mean(int8_pred == y_test) * 100
+
+	print("\n{0:>22} | {1:>12} | {2:>12} | {3:>12}".format("Engine", "Startup (s)", "Images/s", "Accuracy (%)"))
+	print("---------------------------------------------------------------------")
+	print("{0:>22} | {1:>12.3f} | {2:>12.1f} | {3:>12.2f}".format("TensorFlow (frozen)", tf_startup, x_test.shape[0] / tf_seconds, tf_acc))
+	print("{0:>22} | {1:>12.3f} | {2:>12.1f} | {3:>12.2f}".format("numpy int8", int8_startup, x_test.shape[0] / int8_seconds, int8_acc))
+	print("\nAccuracy delta: %+.2f%%, predictions agree on %.2f%% of the test images" % (int8_acc - tf_acc, np.mean(tf_pred == int8_pred) * 100))
+	print("Weights: %.1f MB as int8 vs %.1f MB as float32\n" % (os.path.getsize(int8_model_path) / 1e6, os.path.getsize(classify.frozen_model_path) / 1e6))
+
+
+if __name__ == '__main__':
+	if len(sys.argv) > 1 and sys.argv[1] == 'export':
+		print("Quantized weights written to " + export())
+	elif len(sys.argv) > 1 and sys.argv[1] == 'test':
+		model = Int8MLP()
+		if len(sys.argv) > 2:
+			image = cifar10_cache.load_image(sys.argv[2])
+			print("\nThe network predicts that the input image is a....  " + label_list[int(model.predict(image[None])[0])] + "\n")
+		else:
+			_, (x_test, y_test) = cifar10_cache.load()
+			print("\nFull Test Set Accuracy (%): " + "{0:.3f}".format(np.mean(model.predict(np.asarray(x_test)) == y_test) * 100) + "\n")
+	elif len(sys.argv) > 2 and sys.argv[1] == 'startup':
+		startup(sys.argv[2])
+	elif len(sys.argv) > 1 and sys.argv[1] == 'bench':
+		benchmark()
+	else:
+		print("\nNot a valid argument, please use an argument in one of the following formats...")
+		print("python mlp_int8.py export\npython mlp_int8.py test [image]\npython mlp_int8.py bench\n")
@@ -0,0 +1,315 @@
+#
+#   Synchronous data-parallel training of the classify.py network on several local processes
+#   The parameters live in one flat float32 vector in shared memory. Every step, the parent process
+#   writes the indices of the next batch of 128 training images to shared memory, and each of the
+#   num_workers worker processes...
+#       - reads the current parameters straight from shared memory
+#       - computes the gradients of the loss on its shard of the batch
+#       - writes them into its own slot of a shared gradient buffer
+#   Once every gradient is in, the workers apply the same Adam update as classify.py to the shared
+#   parameters, each one to its own slice of the parameter vector, using the average of the gradients
+#   weighted by shard size. The Adam moments are kept in shared memory too, and the parent process only
+#   hands out the batches.
+#   Each worker batch normalizes its shard with the statistics of that shard alone ("ghost" batch
+#   normalization), and keeps its own running statistics, which are averaged at the end. So the averaged
+#   gradient is NOT the gradient of the whole batch of 128 that classify.py would compute: it is the
+#   ghost batch normalization approximation of it, and the training (and the trained model) depend on
+#   num_workers, with smaller shards giving noisier statistics.
+#   The trained model is saved in the same checkpoint format as 'classify.py train', so
+#   'classify.py test' and 'classify.py export' work on it.
+#
+#   Usage: python parallel_train.py train [num_workers]
+#          python parallel_train.py bench [num_steps]     (scaling over bench_workers)
+#
+
+import os
+import sys
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import tensorflow as tf
+
+import classify
+import cifar10_cache
+
+# Names and shapes of the trainable parameters, in the order they are laid out in the flat vector
+param_shapes = [
+	('w1', (classify.n_input, classify.n_neurons)),
+	('w2', (classify.n_neurons, classify.n_neurons_second)),
+	('w3', (classify.n_neurons_second, classify.n_labels)),
+	('b1', (classify.n_neurons,)),
+	('b2', (classify.n_neurons_second,)),
+	('b3', (classify.n_labels,))
+]
+
+# Adam settings, the same as classify.train
+learning_rate = 0.001
+beta1 = 0.9
+beta2 = 0.999
+adam_epsilon = 1e-08
+
+num_train_steps = 2001
+bench_workers = [1, 2, 4, 8]
+
+# Seconds a process waits at a step barrier before giving up (covers the workers building their graphs)
+barrier_timeout = 600
+
+
+# Function to return (offset, size) of every parameter in the flat vector, and the total size
+def param_layout():
+	layout = {}
+	offset = 0
+	for name, shape in param_shapes:
+		layout[name] = (offset, int(np.prod(shape)))
+		offset += layout[name][1]
+	return layout, offset
+
+
+# Function to return a dictionary of views of the flat vector, one per parameter
+def param_views(flat):
+	layout, _ = param_layout()
+	return {name: flat[layout[name][0]:layout[name][0] + layout[name][1]].reshape(shape) for name, shape in param_shapes}
+
+
+# Function to return the (start, stop) range of the batch that every worker works on
+def shard_ranges(batch_size, num_workers):
+	bounds = np.linspace(0, batch_size, num_workers + 1).astype(int)
+	return [(bounds[i], bounds[i + 1]) for i in range(num_workers)]
+
+
+# Function to apply an Adam update (same form as tf.train.AdamOptimizer) to a slice of the parameters
+# grads holds every worker's gradients for the slice, which are averaged with shard_weights (each
+# computed with its own shard's batch normalization statistics, see the header).
+# Everything is done in place, with tmp and g as scratch space, to keep memory traffic down
+def adam_update(params, m, v, grads, shard_weights, step, g, tmp):
+	np.dot(shard_weights, grads, out=g)
+
+	m *= beta1
+	np.multiply(g, 1 - beta1, out=tmp)
+	m += tmp
+
+	v *= beta2
+	np.square(g, out=tmp)
+	tmp *= 1 - beta2
+	v += tmp
+
+	t = step + 1
+	lr = learning_rate * np.sqrt(1 - beta2**t) / (1 - beta1**t)
+	np.sqrt(v, out=tmp)
+	tmp += adam_epsilon
+	np.divide(m, tmp, out=tmp)
+	tmp *= lr
+	params -= tmp
+
+
+# Function run by every worker process
+# Each step, it waits for the parent to publish a batch, computes the gradients of its shard with
+# respect to the current shared parameters and reports them (with its loss and accuracy). Once every
+# worker has done so, it updates its slice of the parameters
+def worker(rank, num_workers, batch_size, names, barrier, results, threads):
+	try:
+		run_worker(rank, num_workers, batch_size, names, barrier, results, threads)
+	except Exception:
+		# Break the barrier so the parent and the other workers stop waiting for this one
+		barrier.abort()
+		raise
+
+
+# Function with the actual work of a worker process (see worker)
+def run_worker(rank, num_workers, batch_size, names, barrier, results, threads):
+	shms = {name: shared_memory.SharedMemory(name=names[name]) for name in names}
+	_, num_params = param_layout()
+	params = np.ndarray((num_params,), dtype=np.float32, buffer=shms['params'].buf)
+	grads = np.ndarray((num_workers, num_params), dtype=np.float32, buffer=shms['grads'].buf)
+	metrics = np.ndarray((num_workers, 2), dtype=np.float64, buffer=shms['metrics'].buf)
+	batch = np.ndarray((batch_size + 1,), dtype=np.int64, buffer=shms['batch'].buf)
+	moments = np.ndarray((2, num_params), dtype=np.float32, buffer=shms['moments'].buf)
+	start, stop = shard_ranges(batch_size, num_workers)[rank]
+
+	# Slice of the parameter vector this worker updates
+	lo, hi = shard_ranges(num_params, num_workers)[rank]
+	shard_weights = np.array([b - a for a, b in shard_ranges(batch_size, num_workers)], dtype=np.float32) / batch_size
+	g = np.empty(hi - lo, dtype=np.float32)
+	tmp = np.empty(hi - lo, dtype=np.float32)
+
+	(x_train, y_train), _ = cifar10_cache.load()
+	views = param_views(params)
+	my_grads = param_views(grads[rank])
+
+	# The parameters are fed in as placeholders, so the graph always sees the latest shared values
+	x = tf.placeholder(tf.float32, [None, classify.n_input])
+	y_actual = tf.placeholder(tf.int64, [None])
+	P = {name: tf.placeholder(tf.float32, shape) for name, shape in param_shapes}
+	W = {'first_layer': P['w1'], 'second_layer': P['w2'], 'out_layer': P['w3']}
+	b = {'first_layer': P['b1'], 'second_layer': P['b2'], 'out_layer': P['b3']}
+	bn = classify.configure_batch_norm(classify.n_neurons, classify.n_neurons_second)
+	y_pred = classify.make_model(x, W, b, bn)
+	loss = classify.get_loss(y_actual, y_pred)
+	accuracy = classify.get_accuracy(y_actual, y_pred)
+	with tf.control_dependencies(tf.get_collection(tf.GraphKeys.UPDATE_OPS)):
+		grad_ops = [tf.identity(g) for g in tf.gradients(loss, [P[name] for name, _ in param_shapes])]
+
+	# Every worker only uses its share of the cores
+	config = tf.ConfigProto(intra_op_parallelism_threads=threads, inter_op_parallelism_threads=1)
+	sess = tf.Session(config=config)
+	sess.run(tf.global_variables_initializer())
+
+	while True:
+		barrier.wait()
+		if batch[batch_size] < 0:
+			break
+
+		ind = np.sort(batch[start:stop])
+		feed_dict = {P[name]: views[name] for name, _ in param_shapes}
+		feed_dict[x] = classify.prepare_images(x_train.take(ind, axis=0))
+		feed_dict[y_actual] = y_train.take(ind, axis=0).astype(np.int64)
+		out = sess.run(grad_ops + [loss, accuracy], feed_dict=feed_dict)
+
+		for (name, _), grad in zip(param_shapes, out):
+			np.copyto(my_grads[name], grad)
+		metrics[rank] = out[-2:]
+		barrier.wait()
+
+		adam_update(params[lo:hi], moments[0, lo:hi], moments[1, lo:hi], grads[:, lo:hi], shard_weights, batch[batch_size], g, tmp)
+		barrier.wait()
+
+	results.put((rank, sess.run(bn)))
+	for shm in shms.values():
+		shm.close()
+
+
+# Function to train the network with num_workers processes for num_steps steps
+# Returns (trained parameters as a dictionary of arrays, averaged running statistics, steps per second)
+# The steps per second doesn't include starting the workers and building their graphs
+def train_parallel(num_workers, num_steps=num_train_steps, batch_size=classify.batch_size, seed=0, verbose=True):
+	(x_train, _), _ = cifar10_cache.load()
+	_, num_params = param_layout()
+	sizes = {'params': num_params * 4, 'grads': num_workers * num_params * 4, 'moments': 2 * num_params * 4, 'metrics': num_workers * 2 * 8, 'batch': (batch_size + 1) * 8}
+	shms = {name: shared_memory.SharedMemory(create=True, size=size) for name, size in sizes.items()}
+	workers = []
+
+	try:
+		params = np.ndarray((num_params,), dtype=np.float32, buffer=shms['params'].buf)
+		metrics = np.ndarray((num_workers, 2), dtype=np.float64, buffer=shms['metrics'].buf)
+		batch = np.ndarray((batch_size + 1,), dtype=np.int64, buffer=shms['batch'].buf)
+		np.ndarray((2, num_params), dtype=np.float32, buffer=shms['moments'].buf)[...] = 0
+
+		# The same initialization as classify.configure_layers (standard normal weights, zero biases)
+		rng = np.random.RandomState(seed)
+		for name, view in param_views(params).items():
+			view[...] = rng.standard_normal(view.shape) if name.startswith('w') else 0
+
+		shard_weights = np.array([stop - start for start, stop in shard_ranges(batch_size, num_workers)], dtype=np.float32) / batch_size
+
+		ctx = multiprocessing.get_context('spawn')
+		barrier = ctx.Barrier(num_workers + 1, timeout=barrier_timeout)
+		results = ctx.Queue()
+		threads = max(1, (os.cpu_count() or 1) // num_workers)
+		names = {name: shm.name for name, shm in shms.items()}
+		for rank in range(num_workers):
+			workers.append(ctx.Process(target=worker, args=(rank, num_workers, batch_size, names, barrier, results, threads)))
+			workers[-1].start()
+
+		if verbose:
+			print("\n{0:>7} | {1:>12} | {2:>12}".format("Step", "Train Loss", "Train Acc %"))
+			print("------------------------------------")
+
+		# Batches are reshuffled every epoch, like classify.batch_iterator
+		shuff = rng.permutation(x_train.shape[0])
+		pos = 0
+		start_time = None
+		for step in range(num_steps):
+			if pos + batch_size > shuff.shape[0]:
+				shuff = rng.permutation(x_train.shape[0])
+				pos = 0
+			batch[:batch_size] = shuff[pos:pos + batch_size]
+			batch[batch_size] = step
+			pos += batch_size
+
+			# Batch published, gradients written, parameters updated
+			barrier.wait()
+			barrier.wait()
+			if verbose and step % 100 == 0:
+				loss_out, acc = np.dot(shard_weights, metrics)
+				print("{0:>7} | {1:>12.4f} | {2:>12.3f}".format(step, loss_out, acc * 100))
+			barrier.wait()
+
+			# Time from the end of the first step, once every worker has built its graph
+			if step == 0:
+				start_time = time.perf_counter()
+
+		seconds = time.perf_counter() - start_time
+		batch[batch_size] = -1
+		barrier.wait()
+
+		bn_out = [results.get()[1] for _ in workers]
+		for p in workers:
+			p.join()
+
+		# Average the running statistics of the workers
+		bn = {layer: tuple(np.mean([stats[layer][i] for stats in bn_out], axis=0) for i in range(2)) for layer in bn_out[0]}
+		trained = {name: np.array(view) for name, view in param_views(params).items()}
+	finally:
+		# Stop any workers still running if training failed (after giving them time to report errors)
+		for p in workers:
+			p.join(5)
+			if p.is_alive():
+				p.terminate()
+		for shm in shms.values():
+			shm.close()
+			shm.unlink()
+
+	return trained, bn, (num_steps - 1) / seconds if num_steps > 1 else 0.0
+
+
+# Function to save trained parameters and running statistics in the classify.py checkpoint format,
+# and return the loss and accuracy on the full test set
+def save_model(trained, bn_out):
+	_, (x_test, y_test) = cifar10_cache.load()
+
+	with tf.Graph().as_default():
+		x, y_actual, W, b = classify.configure_layers(classify.n_input, classify.n_neurons, classify.n_labels)
+		bn = classify.configure_batch_norm(classify.n_neurons, classify.n_neurons_second)
+		y_eval = classify.make_model(x, W, b, bn, training=False)
+		loss = classify.get_loss(y_actual, y_eval)
+		accuracy = classify.get_accuracy(y_actual, y_eval)
+
+		with tf.Session() as sess:
+			sess.run(tf.global_variables_initializer())
+			values = {'w1': W['first_layer'], 'w2': W['second_layer'], 'w3': W['out_layer'], 'b1': b['first_layer'], 'b2': b['second_layer'], 'b3': b['out_layer']}
+			for name, var in values.items():
+				var.load(trained[name], sess)
+			for layer in bn:
+				bn[layer][0].load(bn_out[layer][0], sess)
+				bn[layer][1].load(bn_out[layer][1], sess)
+
+			tf.train.Saver().save(sess, classify.model_dir)
+			return classify.evaluate(sess, loss, accuracy, x, y_actual, x_test, y_test)
+
+
+# Function to measure the training speed with every number of workers in bench_workers
+def benchmark(num_steps=100):
+	print("\n{0:>8} | {1:>12} | {2:>10} | {3:>12}".format("Workers", "Steps/s", "Speedup", "Efficiency"))
+	print("--------------------------------------------------")
+	base = None
+	for num_workers in bench_workers:
+		_, _, rate = train_parallel(num_workers, num_steps, verbose=False)
+		base = base or rate
+		print("{0:>8} | {1:>12.2f} | {2:>9.2f}x | {3:>11.1f}%".format(num_workers, rate, rate / base, 100 * rate / base / num_workers))
+	print("\n(%d cores available)\n" % (os.cpu_count() or 1))
+
+
+if __name__ == '__main__':
+	if len(sys.argv) > 1 and sys.argv[1] == 'train':
+		num_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+		trained, bn, rate = train_parallel(num_workers)
+		test_loss, test_acc = save_model(trained, bn)
+		print("\nTrained with %d workers at %.2f steps/s" % (num_workers, rate))
+		print("Full Test Set Loss:         " + str(test_loss))
+		print("Full Test Set Accuracy (%): " + str(("{0:.3f}".format(test_acc * 100))) + "\n")
+	elif len(sys.argv) > 1 and sys.argv[1] == 'bench':
+		benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100)
+	else:
+		print("\nNot a valid argument, please use an argument in one of the following formats...")
+		print("python parallel_train.py train [num_workers]\npython parallel_train.py bench [num_steps]\n")
@@ -0,0 +1,187 @@
+#
+#   Magnitude pruning of the first layer of the classify.py network, with sparse inference
+#   w1 (3072 x 2000) holds about 6M of the network's 8M parameters, and most of its multiplications.
+#   Pruning zeroes the smallest magnitude weights of w1 until the target sparsity is reached, and can
+#   optionally fine-tune the network for a few steps with the pruned weights held at zero. The batch
+#   normalization is then folded into the weights (see classify.fold_batch_norm), and the model is
+#   saved to an .npz file with w1 in CSR form (only the non-zero weights, with their column indices
+#   and row offsets). Inference runs in numpy, multiplying by w1 with scipy's sparse matmul.
+#
+#   Usage: python prune.py export sparsity [finetune_steps]     (e.g. python prune.py export 0.9 200)
+#          python prune.py test [image]
+#          python prune.py bench [finetune_steps]              (trade-off over bench_sparsities)
+#
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import scipy.sparse
+import tensorflow as tf
+
+import classify
+import cifar10_cache
+
+pruned_model_path = os.getcwd() + "/model/pruned_model.npz"
+
+label_list = ['airplane', 'automobile', 'bird', 'cat', 'deer', 'dog', 'frog', 'horse', 'ship', 'truck']
+
+# Learning rate of the fine-tuning after pruning (a tenth of the rate used for training)
+finetune_rate = 0.0001
+
+bench_sparsities = [0.5, 0.8, 0.9, 0.95, 0.98]
+bench_batch_size = 1000
+num_latency_images = 200
+
+
+# Function to return a 0/1 mask that zeroes the smallest magnitude fraction (sparsity) of the weights
+def magnitude_mask(w, sparsity):
+	mask = np.ones(w.size, dtype=np.float32)
+	num_pruned = int(round(sparsity * w.size))
+	if num_pruned > 0:
+		mask[np.argpartition(np.absolute(w).ravel(), num_pruned - 1)[:num_pruned]] = 0
+	return mask.reshape(w.shape)
+
+
+# Function to restore the trained model, prune w1 to the given sparsity, and optionally fine-tune
+# for finetune_steps steps (re-applying the mask after every step)
+# Returns the weights and biases with the batch normalization folded in, as numpy arrays
+def prune_model(sparsity, finetune_steps=0):
+	with tf.Graph().as_default():
+		x, y_actual, W, b = classify.configure_layers(classify.n_input, classify.n_neurons, classify.n_labels)
+		bn = classify.configure_batch_norm(classify.n_neurons, classify.n_neurons_second)
+		y_pred = classify.make_model(x, W, b, bn)
+		loss = classify.get_loss(y_actual, y_pred)
+
+		mask = tf.placeholder(tf.float32, [classify.n_input, classify.n_neurons])
+		apply_mask = tf.assign(W['first_layer'], W['first_layer'] * mask)
+		with tf.control_dependencies(tf.get_collection(tf.GraphKeys.UPDATE_OPS)):
+			train_step = tf.train.AdamOptimizer(learning_rate=finetune_rate).minimize(loss)
+
+		model_vars = list(W.values()) + list(b.values()) + [var for stats in bn.values() for var in stats]
+		with tf.Session() as sess:
+			sess.run(tf.global_variables_initializer())
+			tf.train.Saver(model_vars).restore(sess, tf.train.latest_checkpoint(str(classify.cur_dir) + "/model/"))
+
+			mask_out = magnitude_mask(sess.run(W['first_layer']), sparsity)
+			sess.run(apply_mask, feed_dict={mask: mask_out})
+
+			if finetune_steps > 0:
+				(x_train, y_train), _ = cifar10_cache.load()
+				batches = classify.prefetch(classify.batch_iterator(x_train, y_train, classify.batch_size))
+				for i in range(finetune_steps):
+					batch_xs, batch_ys = next(batches)
+					sess.run(train_step, feed_dict={x: batch_xs, y_actual: batch_ys})
+					sess.run(apply_mask, feed_dict={mask: mask_out})
+
+			W_out, b_out, bn_out = sess.run([W, b, bn])
+
+	return classify.fold_batch_norm(W_out, b_out, bn_out)
+
+
+# Function to save folded weights to npz_path, with w1 in CSR form
+# w1 is stored transposed (2000 x 3072), so each CSR row holds the inputs of one first layer neuron
+def save_pruned(W, b, npz_path=pruned_model_path):
+	w1 = scipy.sparse.csr_matrix(W['first_layer'].T.astype(np.float32))
+	np.savez(npz_path, w1_data=w1.data, w1_indices=w1.indices, w1_indptr=w1.indptr, w1_shape=np.array(w1.shape),
+		w2=W['second_layer'].astype(np.float32), w3=W['out_layer'].astype(np.float32),
+		b1=b['first_layer'].astype(np.float32), b2=b['second_layer'].astype(np.float32), b3=b['out_layer'].astype(np.float32))
+	return npz_path
+
+
+class SparseMLP (object):
+	# Load a model saved by save_pruned
+	def __init__ (self, npz_path=pruned_model_path):
+		with np.load(npz_path) as arrays:
+			self.w1 = scipy.sparse.csr_matrix((arrays['w1_data'], arrays['w1_indices'], arrays['w1_indptr']), shape=tuple(arrays['w1_shape']))
+			self.w2 = arrays['w2']
+			self.w3 = arrays['w3']
+			self.b = [arrays['b1'], arrays['b2'], arrays['b3']]
+
+	# Function to return the fraction of w1 that is zero
+	def sparsity(self):
+		return 1.0 - self.w1.nnz / float(self.w1.shape[0] * self.w1.shape[1])
+
+	# Function to return the logits for a batch of uint8 images
+	def logits(self, images):
+		x = classify.prepare_images(images)
+		# (w1^T x^T)^T, so the sparse matrix is on the left where CSR is efficient
+		layer_one = np.maximum(np.asarray(self.w1.dot(x.T)).T + self.b[0], 0)
+		layer_two = np.maximum(np.matmul(layer_one, self.w2) + self.b[1], 0)
+		return np.matmul(layer_two, self.w3) + self.b[2]
+
+	# Function to return the predicted class index of every image, batch_size images at a time
+	def predict(self, images, batch_size=bench_batch_size):
+		return np.concatenate([np.argmax(self.logits(images[start:start + batch_size]), 1) for start in range(0, images.shape[0], batch_size)])
+
+
+# Function to return the dense numpy logits for a batch of uint8 images, with folded weights
+def dense_logits(W, b, images):
+	layer_one = np.maximum(np.matmul(classify.prepare_images(images), W['first_layer']) + b['first_layer'], 0)
+	layer_two = np.maximum(np.matmul(layer_one, W['second_layer']) + b['second_layer'], 0)
+	return np.matmul(layer_two, W['out_layer']) + b['out_layer']
+
+
+# Function to measure a logits function on the test set
+# Returns (accuracy in %, batch-1 latency in ms, images per second in batches of bench_batch_size)
+def measure(logits, x_test, y_test):
+	pred = np.concatenate([np.argmax(logits(x_test[i:i + bench_batch_size]), 1) for i in range(0, x_test.shape[0], bench_batch_size)])
+	accuracy = np.mean(pred == y_test) * 100
+
+	logits(x_test[:1])
+	start = time.perf_counter()
+	for i in range(num_latency_images):
+		logits(x_test[i:i + 1])
+	latency = (time.perf_counter() - start) / num_latency_images * 1000
+
+	start = time.perf_counter()
+	for i in range(0, x_test.shape[0], bench_batch_size):
+		logits(x_test[i:i + bench_batch_size])
+	rate = x_test.shape[0] / (time.perf_counter() - start)
+
+	return accuracy, latency, rate
+
+
+# Function to report the sparsity vs accuracy vs latency trade-off on the CIFAR-10 test set
+# The pruned models are saved to a temporary directory, leaving model/pruned_model.npz alone
+def benchmark(finetune_steps=0):
+	_, (x_test, y_test) = cifar10_cache.load()
+	x_test = np.asarray(x_test)
+
+	print("\n{0:>16} | {1:>10} | {2:>12} | {3:>16} | {4:>10}".format("w1", "Non-zeros", "Accuracy (%)", "Batch-1 latency", "Images/s"))
+	print("--------------------------------------------------------------------------------")
+
+	W, b = prune_model(0.0)
+	accuracy, latency, rate = measure(lambda images: dense_logits(W, b, images), x_test, y_test)
+	print("{0:>16} | {1:>10} | {2:>12.2f} | {3:>13.3f} ms | {4:>10.1f}".format("dense", W['first_layer'].size, accuracy, latency, rate))
+
+	with tempfile.TemporaryDirectory() as bench_dir:
+		for sparsity in bench_sparsities:
+			W, b = prune_model(sparsity, finetune_steps)
+			model = SparseMLP(save_pruned(W, b, os.path.join(bench_dir, "pruned_model.npz")))
+			accuracy, latency, rate = measure(model.logits, x_test, y_test)
+			print("{0:>16} | {1:>10} | {2:>12.2f} | {3:>13.3f} ms | {4:>10.1f}".format("%.0f%% sparse CSR" % (sparsity * 100), model.w1.nnz, accuracy, latency, rate))
+
+	print("\n(fine-tuned for %d steps after pruning)\n" % finetune_steps)
+
+
+if __name__ == '__main__':
+	if len(sys.argv) > 2 and sys.argv[1] == 'export':
+		finetune_steps = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+		W, b = prune_model(float(sys.argv[2]), finetune_steps)
+		print("Pruned model written to " + save_pruned(W, b))
+	elif len(sys.argv) > 1 and sys.argv[1] == 'test':
+		model = SparseMLP()
+		if len(sys.argv) > 2:
+			image = cifar10_cache.load_image(sys.argv[2])
+			print("\nThe network predicts that the input image is a....  " + label_list[int(model.predict(image[None])[0])] + "\n")
+		else:
+			_, (x_test, y_test) = cifar10_cache.load()
+			print("\nw1 sparsity: %.2f%%" % (model.sparsity() * 100))
+			print("Full Test Set Accuracy (%): " + "{0:.3f}".format(np.mean(model.predict(np.asarray(x_test)) == y_test) * 100) + "\n")
+	elif len(sys.argv) > 1 and sys.argv[1] == 'bench':
+		benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+	else:
+		print("\nNot a valid argument, please use an argument in one of the following formats...")
+		print("python prune.py export sparsity [finetune_steps]\npython prune.py test [image]\npython prune.py bench [finetune_steps]\n")
@@ -8,24 +8,56 @@
 #       - Layer 5: FC(100 neurons) --> batch norm. --> ReLU
 #   The network uses a hinge loss calculation for its loss function, and uses the Adam optimizer for performing training steps
 #   The network also makes use of mini-batch training
+#   Batch normalization uses the statistics of the batch in training, and keeps moving averages of them in the
+#   checkpoint. Testing uses the moving averages, folded into the weights of every layer, so a prediction
+#   doesn't depend on the other images in its batch
+#
+#   Usage: python CNNclassify.py train
+#          python CNNclassify.py test xxx.png
+#          python CNNclassify.py bench     (fused vs unfused inference on the test set)
+#          python CNNclassify.py predict <dir|"glob"> [output.csv|output.jsonl] [visualize]
 # 
 
 import sys
+import csv
+import glob
+import json
+import time
+import resource
+from concurrent.futures import ThreadPoolExecutor
 import tensorflow as tf
 import numpy as np
-from keras.datasets import cifar10
 import os
 import cv2
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
+# The CIFAR-10 data is shared with hw1 through the cifar10_cache module one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import cifar10_cache
+
 # Define CIFAR-10 classes
 cifar10Classes = ['plane', 'car', 'bird', 'cat', 'deer', 'dog', 'frog', 'horse', 'ship', 'truck']
 
+# Define the file the preprocessing parameters are saved to, next to the model checkpoint
+preprocessPath = './model/preprocess.npz'
+
+# Define the decay of the moving batch normalization statistics, and the variance epsilon
+bnDecay = 0.99
+bnEpsilon = 1e-3
+
+# Define the number of images per run of the network, and the number of image decoding threads, in predict mode
+predictBatchSize = 256
+predictThreads = min(8, os.cpu_count() or 1)
+imageExtensions = ('.png', '.jpg', '.jpeg', '.bmp', '.ppm', '.tif', '.tiff', '.webp')
+
 class seeNet (object):
     # Initialize Network Model
-    def __init__ (self, training=1):
+    # With training=0 the model is restored, and unless fused=0, the moving batch normalization 
+    # statistics are folded into the weights (see fuseBatchNorm)
+    def __init__ (self, training=1, fused=1):
         nHNeurons = [1000, 100]
         nLabels = 10
+        self.training = training
 
         self.x = tf.placeholder(name="x", shape=[None, 32, 32, 3], dtype=tf.float32)
         self.yActual = tf.placeholder(name="yActual", shape=[None], dtype=tf.int64)
@@ -47,18 +79,19 @@ class seeNet (object):
         'fifth_layer': tf.get_variable(name="b5", shape=nHNeurons[1]),
         'out_layer': tf.get_variable(name="b6", shape=nLabels),
         }
+        self.W = W
+        self.b = b
+
+        # Moving batch normalization statistics of every hidden layer, created by batchNorm
+        self.bnStats = {}
 
         # First Hidden Layer
         layer_one = tf.nn.conv2d(self.x, W['first_layer'], strides=[1,1,1,1], padding="VALID")
         self.firstConvOutput = layer_one
         layer_one = tf.nn.bias_add(layer_one, b['first_layer'])
+        layer_one = self.batchNorm(layer_one, 1)
         if training == 1:
-            mean1, variance1 = tf.nn.moments(layer_one, axes=[0])
-            layer_one = tf.nn.batch_normalization(layer_one, mean1, variance1, None, None, 1e-3)
             layer_one = tf.nn.dropout(layer_one, 0.8)
-        else: 
-            mean1, variance1 = tf.nn.moments(layer_one, axes=[0, 1, 2])
-            layer_one = tf.nn.batch_normalization(layer_one, mean1, variance1, None, None, 1e-3)
         layer_one = tf.nn.relu(layer_one)
 
         layer_one = tf.nn.max_pool(layer_one, ksize=[1, 2, 2, 1], strides=[1,2,2,1], padding="VALID")
@@ -66,25 +99,17 @@ class seeNet (object):
         # Second Hidden Layer
         layer_two = tf.nn.conv2d(layer_one, W['second_layer'], strides=[1,1,1,1], padding="VALID")
         layer_two = tf.nn.bias_add(layer_two, b['second_layer'])
+        layer_two = self.batchNorm(layer_two, 2)
         if training == 1:
-            mean2, variance2 = tf.nn.moments(layer_two, axes=[0])
-            layer_two = tf.nn.batch_normalization(layer_two, mean2, variance2, None, None, 1e-3)
             layer_two = tf.nn.dropout(layer_two, 0.8)
-        else: 
-            mean2, variance2 = tf.nn.moments(layer_two, axes=[0, 1, 2])
-            layer_two = tf.nn.batch_normalization(layer_two, mean2, variance2, None, None, 1e-3)
         layer_two = tf.nn.relu(layer_two)
 
         # Third Hidden Layer
         layer_three = tf.nn.conv2d(layer_two, W['third_layer'], strides=[1,1,1,1], padding="VALID")
         layer_three = tf.nn.bias_add(layer_three, b['third_layer'])
+        layer_three = self.batchNorm(layer_three, 3)
         if training == 1:
-            mean3, variance3 = tf.nn.moments(layer_three, axes=[0])
-            layer_three = tf.nn.batch_normalization(layer_three, mean3, variance3, None, None, 1e-3)
             layer_three = tf.nn.dropout(layer_three, 0.8)
-        else: 
-            mean3, variance3 = tf.nn.moments(layer_three, axes=[0, 1, 2])
-            layer_three = tf.nn.batch_normalization(layer_three, mean3, variance3, None, None, 1e-3)
         layer_three = tf.nn.relu(layer_three)
 
         layer_three = tf.reshape(layer_three, [-1, 10*10*128])
@@ -92,37 +117,29 @@ class seeNet (object):
         # Fourth Hidden Layer
         layer_four = tf.matmul(layer_three, W['fourth_layer'])
         layer_four = tf.nn.bias_add(layer_four, b['fourth_layer'])
-        if training == 1:
-            mean4, variance4 = tf.nn.moments(layer_four, axes=[0])
-            layer_four = tf.nn.batch_normalization(layer_four, mean4, variance4, None, None, 1e-3)
-        else: 
-            mean4, variance4 = tf.nn.moments(layer_four, axes=[0, 1])
-            layer_four = tf.nn.batch_normalization(layer_four, mean4, variance4, None, None, 1e-3)
+        layer_four = self.batchNorm(layer_four, 4)
         layer_four = tf.nn.relu(layer_four)
 
         # Fifth Hidden Layer
         layer_five = tf.matmul(layer_four, W['fifth_layer'])
         layer_five = tf.nn.bias_add(layer_five, b['fifth_layer'])
-        if training == 1:
-            mean5, variance5 = tf.nn.moments(layer_five, axes=[0])
-            layer_five = tf.nn.batch_normalization(layer_five, mean5, variance5, None, None, 1e-3)
-        else: 
-            mean5, variance5 = tf.nn.moments(layer_five, axes=[0, 1])
-            layer_five = tf.nn.batch_normalization(layer_five, mean5, variance5, None, None, 1e-3)
+        layer_five = self.batchNorm(layer_five, 5)
         layer_five = tf.nn.relu(layer_five)
 
         # Output Layer
         y_pred = tf.matmul(layer_five,W['out_layer'])
         y_pred = tf.nn.bias_add(y_pred, b['out_layer'])
+        self.yPred = y_pred
 
         # Define loss function and calculate loss
         totalLoss = tf.losses.hinge_loss(tf.one_hot(self.yActual, 10), logits=y_pred)
         # Add regularization to loss
         self.meanLoss = tf.reduce_mean(totalLoss) + 1e-5*tf.nn.l2_loss(W['first_layer']) + 1e-5*tf.nn.l2_loss(W['second_layer']) + 1e-5*tf.nn.l2_loss(W['third_layer'])+ 1e-5*tf.nn.l2_loss(W['fourth_layer'])+ 1e-5*tf.nn.l2_loss(W['fifth_layer'])+ 1e-5*tf.nn.l2_loss(W['out_layer'])
 
-        # Define the Adam Optimizer
+        # Define the Adam Optimizer (every training step also updates the moving statistics)
         adamOptimizer = tf.train.AdamOptimizer(1e-3)
-        self.trainStep = adamOptimizer.minimize(self.meanLoss)
+        with tf.control_dependencies(tf.get_collection(tf.GraphKeys.UPDATE_OPS)):
+            self.trainStep = adamOptimizer.minimize(self.meanLoss)
 
         # Determine accuracy
         correctPredictionFlag = tf.equal(tf.argmax(y_pred, 1), self.yActual)
@@ -146,24 +163,84 @@ class seeNet (object):
         else:
             self.saver.restore(self.sess, './model/saved_model')
             print("Model restored from file")
+            if fused == 1:
+                self.fuseBatchNorm()
+
+    # Function to batch normalize the output of hidden layer number index, per channel (the last axis)
+    # In training, the layer is normalized with the statistics of the batch, and the moving averages of 
+    # those are updated through the UPDATE_OPS collection. Otherwise the moving averages are used
+    def batchNorm(self, layer, index):
+        channels = int(layer.shape[-1])
+        movingMean = tf.get_variable(name="bnMean" + str(index), shape=[channels], initializer=tf.zeros_initializer(), trainable=False)
+        movingVariance = tf.get_variable(name="bnVariance" + str(index), shape=[channels], initializer=tf.ones_initializer(), trainable=False)
+        self.bnStats[index] = (movingMean, movingVariance)
+
+        if self.training != 1:
+            return tf.nn.batch_normalization(layer, movingMean, movingVariance, None, None, bnEpsilon)
+
+        mean, variance = tf.nn.moments(layer, axes=list(range(len(layer.shape) - 1)))
+        tf.add_to_collection(tf.GraphKeys.UPDATE_OPS, tf.assign(movingMean, bnDecay*movingMean + (1 - bnDecay)*mean))
+        tf.add_to_collection(tf.GraphKeys.UPDATE_OPS, tf.assign(movingVariance, bnDecay*movingVariance + (1 - bnDecay)*variance))
+        return tf.nn.batch_normalization(layer, mean, variance, None, None, bnEpsilon)
+
+    # Function to replace the restored model with an inference-only graph, in which the moving batch 
+    # normalization statistics are folded into the weights and biases of every hidden layer...
+    #     BN(conv(x, W) + b) = conv(x, W') + b',  W' = W / sqrt(var + eps),  b' = (b - mean) / sqrt(var + eps)
+    # (scaling every output channel), leaving conv + bias + ReLU for every layer
+    def fuseBatchNorm(self):
+        W, b, stats = self.sess.run([self.W, self.b, self.bnStats])
+        layers = ['first_layer', 'second_layer', 'third_layer', 'fourth_layer', 'fifth_layer']
+        for index, layer in enumerate(layers):
+            mean, variance = stats[index + 1]
+            scale = 1.0 / np.sqrt(variance + bnEpsilon)
+            W[layer] = W[layer] * scale
+            b[layer] = (b[layer] - mean) * scale
+
+        graph = tf.Graph()
+        with graph.as_default():
+            self.x = tf.placeholder(name="x", shape=[None, 32, 32, 3], dtype=tf.float32)
+            self.yActual = tf.placeholder(name="yActual", shape=[None], dtype=tf.int64)
+
+            layer = tf.nn.conv2d(self.x, tf.constant(W['first_layer']), strides=[1,1,1,1], padding="VALID")
+            self.firstConvOutput = layer
+            layer = tf.nn.relu(tf.nn.bias_add(layer, tf.constant(b['first_layer'])))
+            layer = tf.nn.max_pool(layer, ksize=[1, 2, 2, 1], strides=[1,2,2,1], padding="VALID")
+            for name in ['second_layer', 'third_layer']:
+                layer = tf.nn.conv2d(layer, tf.constant(W[name]), strides=[1,1,1,1], padding="VALID")
+                layer = tf.nn.relu(tf.nn.bias_add(layer, tf.constant(b[name])))
+            layer = tf.reshape(layer, [-1, 10*10*128])
+            for name in ['fourth_layer', 'fifth_layer']:
+                layer = tf.nn.relu(tf.nn.bias_add(tf.matmul(layer, tf.constant(W[name])), tf.constant(b[name])))
+            self.yPred = tf.nn.bias_add(tf.matmul(layer, tf.constant(W['out_layer'])), tf.constant(b['out_layer']))
+
+            self.prediction = tf.argmax(self.yPred, 1)
+            self.accuracy = tf.reduce_mean(tf.cast(tf.equal(self.prediction, self.yActual), tf.float32))
+
+            tfConfig = tf.ConfigProto(allow_soft_placement=True)
+            tfConfig.gpu_options.allow_growth = True
+            self.sess.close()
+            self.sess = tf.Session(config=tfConfig)
 
 
     # Function to train the network
-    def train(self, xTrain, yTrain, xTest, yTest, numSteps=1000, batchSize=128):
-        print('{0:>7} {1:>12} {2:>12} {3:>12} {4:>12}'.format('Loop', 'Train Loss', 'Train Acc %', 'Test Loss', 'Test Acc %'))
+    # The images are uint8, and each batch is normalized by subtracting meanImage as it is fed
+    # Every epoch only shuffles the indices of the training data, and each batch gathers its own images
+    def train(self, xTrain, yTrain, xTest, yTest, meanImage, numSteps=1000, batchSize=128):
+        print('{0:>7} {1:>12} {2:>12} {3:>12} {4:>12} {5:>10} {6:>10}'.format('Loop', 'Train Loss', 'Train Acc %', 'Test Loss', 'Test Acc %', 'Epoch s', 'Peak MB'))
+        trainStart = time.perf_counter()
         for i in range(numSteps):
-            # Shuffle the training data
-            datInd = np.arange(xTrain.shape[0])
-            np.random.shuffle(datInd)
-            xTrain = xTrain[datInd]
-            yTrain = yTrain[datInd]
+            epochStart = time.perf_counter()
+
+            # Shuffle the training data indices
+            datInd = np.random.permutation(xTrain.shape[0])
 
             # Train in batches
             losses = []
             accuracies = []
             for j in range(0, xTrain.shape[0], batchSize):
-                xBatch = xTrain[j:j + batchSize]
-                yBatch = yTrain[j:j + batchSize]
+                batchInd = np.sort(datInd[j:j + batchSize])
+                xBatch = cifar10_cache.center_batch(xTrain[batchInd], meanImage)
+                yBatch = yTrain[batchInd]
                 trainLoss, trainAccuracy, _ = self.sess.run([self.meanLoss, self.accuracy, self.trainStep], feed_dict={self.x: xBatch, self.yActual: yBatch})
                 losses.append(trainLoss)
                 accuracies.append(trainAccuracy)
@@ -174,7 +251,7 @@ class seeNet (object):
             losses = []
             accuracies = []
             for j in range(0, xTest.shape[0], batchSize):
-                xBatch = xTest[j:j + batchSize]
+                xBatch = cifar10_cache.center_batch(xTest[j:j + batchSize], meanImage)
                 yBatch = yTest[j:j + batchSize]
                 testLoss, testAccuracy = self.sess.run([self.meanLoss, self.accuracy], feed_dict={self.x: xBatch, self.yActual: yBatch})
                 losses.append(testLoss)
@@ -182,17 +259,25 @@ class seeNet (object):
             avgTestLoss = sum(losses) / len(losses)
             avgTestAcc = sum(accuracies) / len(accuracies)
 
-            # User Log Output
-            print('{0:>7} {1:>12.4f} {2:>12.4f} {3:>12.4f} {4:>12.4f}'.format(str(i+1)+"/"+str(numSteps), avgTrainLoss, avgTrainAcc*100, avgTestLoss, avgTestAcc*100))
+            # User Log Output, with the epoch's wall time and the peak memory use of the process so far (ru_maxrss is in KB)
+            epochTime = time.perf_counter() - epochStart
+            peakMemory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+            print('{0:>7} {1:>12.4f} {2:>12.4f} {3:>12.4f} {4:>12.4f} {5:>10.1f} {6:>10.1f}'.format(str(i+1)+"/"+str(numSteps), avgTrainLoss, avgTrainAcc*100, avgTestLoss, avgTestAcc*100, epochTime, peakMemory))
 
-        # Save the model
+        print('Trained {0} epochs in {1:.1f} s'.format(numSteps, time.perf_counter() - trainStart))
+
+        # Save the model, and the preprocessing its inputs need
         savePath = self.saver.save(self.sess, './model/saved_model')
+        savePreprocess(meanImage)
         print('Model saved in file: {0}'.format(savePath))
 
     # Testing function to determine the network's prediction for the class of an input image (or set of images)
-    def predictOutput(self, imInput):
+    # With visualize, the first conv layer's output for the first image is written to CONV_rslt.png
+    def predictOutput(self, imInput, visualize=True):
+        if not visualize:
+            return self.sess.run(self.prediction, feed_dict={self.x: imInput})
         pred, convLayer1 = self.sess.run([self.prediction, self.firstConvOutput],feed_dict={self.x: imInput})
-        self.makeConvVisualization(convLayer1)
+        self.makeConvVisualization(convLayer1[0])
         return pred
 
     # Function to create the visualization for the result of the first conv layer
@@ -227,36 +312,149 @@ class seeNet (object):
 
     # Function for getting the accuracy of the network when tested with a given set of labeled inputs
     def getAccuracy(self, imInput, imLabel):
-        return self.sess.run([self.accuracy],feed_dict={self.x: imInput, self.y: imLabel})
-
-# Function for reading in and preprocessing an input image
-def readImage(inputImage, meanValue):
+        return self.sess.run([self.accuracy],feed_dict={self.x: imInput, self.yActual: imLabel})
+
+# Function to save the mean image and the other preprocessing parameters of the training data, so 
+# testing doesn't need the dataset
+def savePreprocess(meanImage, path=preprocessPath):
+    np.savez(path, meanImage=np.asarray(meanImage, dtype=np.float32), imageSize=np.array(meanImage.shape[:2]), colorOrder='RGB')
+
+# Function to load the preprocessing parameters saved with the model
+# Models saved before these were written fall back to the mean image of the (cached) training data
+def loadPreprocess(path=preprocessPath):
+    if not os.path.exists(path):
+        print("No preprocessing parameters found in {0}, using the CIFAR-10 training data".format(path))
+        meanImage = cifar10_cache.mean_image()
+        return {'meanImage': meanImage, 'imageSize': meanImage.shape[:2], 'colorOrder': 'RGB'}
+
+    with np.load(path) as params:
+        preprocess = {'meanImage': params['meanImage'], 'imageSize': tuple(int(size) for size in params['imageSize']), 'colorOrder': str(params['colorOrder'])}
+    if preprocess['imageSize'] != preprocess['meanImage'].shape[:2]:
+        raise ValueError("The image size {0} in {1} doesn't match its mean image of size {2}".format(preprocess['imageSize'], path, preprocess['meanImage'].shape[:2]))
+    return preprocess
+
+# Function for reading in and preprocessing an input image, as a batch of one
+def readImage(inputImage, preprocess):
+    im = loadImage(inputImage, preprocess)
+    if im is None:
+        raise ValueError("Could not read the image {0}".format(inputImage))
+    return np.expand_dims(im, axis=0)
+
+# Function to decode, resize and normalize one image file with the parameters of loadPreprocess, 
+# returning None if cv2 can't decode it
+def loadImage(inputImage, preprocess):
     im = cv2.imread(inputImage)
-    imgHeight, imgWidth, _ = im.shape
-    im = cv2.resize(im, (32, 32))
-    im = cv2.cvtColor(im, cv2.COLOR_BGR2RGB)
-    im = np.asarray(im)
-    im = np.expand_dims(im, axis=0)
-    im = im.astype(np.float)
-    im -= meanValue
-    return im
-
-# Function to import and preprocess the CIFAR-10 dataset
+    if im is None:
+        return None
+    imgHeight, imgWidth = preprocess['imageSize']
+    im = cv2.resize(im, (imgWidth, imgHeight))
+    if preprocess['colorOrder'] == 'RGB':
+        im = cv2.cvtColor(im, cv2.COLOR_BGR2RGB)
+    return cifar10_cache.center_batch(im, preprocess['meanImage'])
+
+# Function to list the image files in a directory, or the files matching a glob pattern, in sorted order
+def listImages(pattern):
+    if os.path.isdir(pattern):
+        return sorted(os.path.join(pattern, name) for name in os.listdir(pattern) if name.lower().endswith(imageExtensions))
+    return sorted(glob.glob(pattern))
+
+# Function to load the images in batches of batchSize, yielding a list of (path, image or None) per batch
+# The images are decoded in a thread pool (cv2 releases the GIL), and the next batch is decoded while 
+# the current one is being classified
+def imageBatches(paths, preprocess, batchSize=predictBatchSize, numThreads=predictThreads):
+    with ThreadPoolExecutor(max_workers=numThreads) as pool:
+        def submitBatch(start):
+            return [(path, pool.submit(loadImage, path, preprocess)) for path in paths[start:start + batchSize]]
+
+        pending = submitBatch(0)
+        for start in range(batchSize, len(paths) + batchSize, batchSize):
+            batch = pending
+            pending = submitBatch(start)
+            yield [(path, future.result()) for path, future in batch]
+
+# Function to classify every image matching pattern (a directory or a glob), streaming the results to 
+# outputPath as CSV, or as JSON Lines if it ends in .jsonl
+# Images cv2 can't decode are skipped and listed at the end
+def predictImages(network, pattern, outputPath='predictions.csv', visualize=False):
+    paths = listImages(pattern)
+    if not paths:
+        print("No images found for {0}".format(pattern))
+        return
+    preprocess = loadPreprocess()
+    jsonLines = outputPath.endswith('.jsonl')
+
+    print('\nClassifying {0} images in batches of {1}, decoding with {2} threads'.format(len(paths), predictBatchSize, predictThreads))
+    numImages = 0
+    unreadable = []
+    networkTime = 0.0
+    start = time.perf_counter()
+    with open(outputPath, 'w', newline='') as outputFile:
+        writer = csv.writer(outputFile)
+        if not jsonLines:
+            writer.writerow(['file', 'class', 'index'])
+
+        for batchIndex, batch in enumerate(imageBatches(paths, preprocess)):
+            images = [(path, im) for path, im in batch if im is not None]
+            unreadable.extend(path for path, im in batch if im is None)
+            if not images:
+                continue
+
+            networkStart = time.perf_counter()
+            pred = network.predictOutput(np.stack([im for _, im in images]), visualize and numImages == 0)
+            networkTime += time.perf_counter() - networkStart
+
+            for (path, _), index in zip(images, pred):
+                if jsonLines:
+                    outputFile.write(json.dumps({'file': path, 'class': cifar10Classes[index], 'index': int(index)}) + '\n')
+                else:
+                    writer.writerow([path, cifar10Classes[index], index])
+            outputFile.flush()
+
+            numImages += len(images)
+            # Progress output every 20 batches
+            if (batchIndex + 1) % 20 == 0:
+                print('{0:>10} images {1:>10.1f} images/s'.format(numImages, numImages / (time.perf_counter() - start)))
+
+    totalTime = time.perf_counter() - start
+    for path in unreadable:
+        print("Could not read the image {0}".format(path))
+    print('Classified {0} images in {1:.2f} s ({2:.1f} images/s, {3:.2f} s in the network), {4} unreadable'.format(numImages, totalTime, numImages / totalTime, networkTime, len(unreadable)))
+    print('Predictions written to {0}\n'.format(outputPath))
+
+# Function to import the CIFAR-10 dataset
+# The images are kept as uint8 memmaps (see cifar10_cache), and are normalized by subtracting the 
+# mean image one batch at a time
 def getCifar10():
-    (xTrain, yTrain), (xTest, yTest) = cifar10.load_data()
+    (xTrain, yTrain), (xTest, yTest) = cifar10_cache.load()
+    meanImage = cifar10_cache.mean_image()
 
-    # Format input data
-    xTrain = xTrain.astype(np.float)
-    xTest = xTest.astype(np.float)
-    yTrain = np.squeeze(yTrain)
-    yTest = np.squeeze(yTest)
+    return (xTrain, yTrain), (xTest, yTest), meanImage
 
-    # Normalize the data by subtracting the mean image
-    meanImage = np.mean(xTrain, axis=0)
-    xTrain -= meanImage
-    xTest -= meanImage
+# Function to compare the fused inference graph with the unfused one (batch norm. with the moving statistics)
+# on the test set, at batch size 1 and in batches of batchSize
+def benchmark(numLatencyImages=200, batchSize=500):
+    _, (xTest, yTest), meanImage = getCifar10()
+    xTest = cifar10_cache.center_batch(xTest, meanImage)
 
-    return (xTrain, yTrain), (xTest, yTest), meanImage
+    print('\n{0:>10} {1:>18} {2:>12} {3:>12} {4:>22}'.format('Model', 'Batch-1 ms/image', 'Images/s', 'Test Acc %', 'Max |batch - single|'))
+    for name, fused in [('unfused', 0), ('fused', 1)]:
+        with tf.Graph().as_default():
+            network = seeNet(training=0, fused=fused)
+
+        network.sess.run(network.yPred, feed_dict={network.x: xTest[:1]})
+        start = time.perf_counter()
+        singleLogits = np.concatenate([network.sess.run(network.yPred, feed_dict={network.x: xTest[i:i + 1]}) for i in range(numLatencyImages)])
+        latency = (time.perf_counter() - start) / numLatencyImages * 1000
+
+        start = time.perf_counter()
+        batchLogits = np.concatenate([network.sess.run(network.yPred, feed_dict={network.x: xTest[i:i + batchSize]}) for i in range(0, xTest.shape[0], batchSize)])
+        rate = xTest.shape[0] / (time.perf_counter() - start)
+
+        accuracy = np.mean(np.argmax(batchLogits, 1) == yTest) * 100
+        difference = np.amax(np.absolute(batchLogits[:numLatencyImages] - singleLogits))
+        print('{0:>10} {1:>18.3f} {2:>12.1f} {3:>12.2f} {4:>22.2e}'.format(name, latency, rate, accuracy, difference))
+        network.sess.close()
+    print('')
 
 # Main function
 if __name__ == '__main__':
@@ -264,16 +462,22 @@ if __name__ == '__main__':
         if sys.argv[1] == 'train':
             network = seeNet(training=1)
             (xDataTrain, yDataTrain), (xDataTest, yDataTest), meanIm = getCifar10()
-            network.train(xDataTrain, yDataTrain, xDataTest, yDataTest, numSteps=25)
+            network.train(xDataTrain, yDataTrain, xDataTest, yDataTest, meanIm, numSteps=25)
         elif sys.argv[1] == 'test':
             network = seeNet(training=0)
-            (xDataTrain, yDataTrain), (xDataTest, yDataTest), meanIm = getCifar10()
-            predictedClass = cifar10Classes[np.squeeze(network.predictOutput(readImage(sys.argv[2], meanIm)))]
+            preprocess = loadPreprocess()
+            predictedClass = cifar10Classes[np.squeeze(network.predictOutput(readImage(sys.argv[2], preprocess)))]
             print("\nThe network predicts that this image is of a:  %s\n" % predictedClass)
+        elif sys.argv[1] == 'bench':
+            benchmark()
+        elif sys.argv[1] == 'predict' and len(sys.argv) > 2:
+            network = seeNet(training=0)
+            outputPath = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] != 'visualize' else 'predictions.csv'
+            predictImages(network, sys.argv[2], outputPath, visualize='visualize' in sys.argv[3:])
 
     else:
         print("\nNot a valid argument, please use an argument in one of the following formats...")
-        print("python CNNclassify.py train\npython CNNclassify.py test xxx.png\n")
+        print("python CNNclassify.py train\npython CNNclassify.py test xxx.png\npython CNNclassify.py bench\npython CNNclassify.py predict <dir|\"glob\"> [output.csv|output.jsonl] [visualize]\n")
 
 
 